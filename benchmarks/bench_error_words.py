@@ -0,0 +1,74 @@
+"""
+Поиск error_words_detectors в теле ответа: any(w in str(body)) против WordsMatcher
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_error_words
+"""
+import json
+import random
+import timeit
+
+from src.mybootstrap_core_itskovichanton.utils import WordsMatcher
+
+VOCAB = ("the order item price status customer address delivery shipping payment method amount currency "
+         "total tax discount created updated id name value result data items count page").split()
+
+WORDS = ["error", "exception", "failed", "failure", "denied", "forbidden", "invalid", "timeout", "unavailable",
+         "refused", "traceback", "stacktrace", "fatal", "panic", "ошибка", "отказ", "недоступен", "not found",
+         "bad request", "internal"] + [f"ERR_{i:03d}" for i in range(40)]
+
+
+def make_body(size: int, tail: str = None) -> bytes:
+    rnd = random.Random(size)
+    rows = []
+    n = 0
+    while n < size:
+        row = {rnd.choice(VOCAB): " ".join(rnd.choices(VOCAB, k=8)) for _ in range(6)}
+        n += len(json.dumps(row)) + 2
+        rows.append(row)
+    r = json.dumps(rows)
+    if tail:
+        r = r[:-1] + f', "{tail}"]'
+    return r.encode()
+
+
+def legacy_detect(body: bytes, words) -> bool:
+    # как было: тело приводится к строке, обрезается до 10000 символов, слова ищутся по очереди
+    text = str(body)
+    if len(text) > 10000:
+        text = text[:10000] + f"...(truncated, total={len(text)})"
+    return any(w in text for w in words)
+
+
+def legacy_detect_full(body: bytes, words) -> bool:
+    text = str(body)
+    return any(w in text for w in words)
+
+
+def per_call_ms(stmt, number) -> float:
+    stmt()
+    return min(timeit.repeat(stmt, number=number, repeat=5)) / number * 1e3
+
+
+def main():
+    matcher = WordsMatcher(WORDS)
+    print(f"{len(WORDS)} words")
+    print(f"{'body':<26}{'legacy 10K, ms':>16}{'legacy full, ms':>17}{'matcher, ms':>13}{'matcher 16K, ms':>17}"
+          f"{'found (10K/full/m/16K)':>26}")
+    for size in (100 * 1024, 1024 * 1024):
+        for tail in (None, "ошибка"):
+            body = make_body(size, tail)
+            number = 20 if size < 1024 * 1024 else 3
+            found = (legacy_detect(body, WORDS), legacy_detect_full(body, WORDS), matcher.search(body) is not None,
+                     matcher.search(body, 16 * 1024) is not None)
+            name = f"{len(body) // 1024} KB" + (", word at end" if tail else ", clean")
+            print(f"{name:<26}"
+                  f"{per_call_ms(lambda: legacy_detect(body, WORDS), number):>16.2f}"
+                  f"{per_call_ms(lambda: legacy_detect_full(body, WORDS), number):>17.2f}"
+                  f"{per_call_ms(lambda: matcher.search(body), number):>13.2f}"
+                  f"{per_call_ms(lambda: matcher.search(body, 16 * 1024), number):>17.2f}"
+                  f"{'/'.join('+' if f else '-' for f in found):>26}")
+
+
+if __name__ == '__main__':
+    main()
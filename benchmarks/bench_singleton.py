@@ -0,0 +1,80 @@
+"""
+Латентность попадания в кэш @singleton: исходная реализация против текущей
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_singleton
+"""
+import functools
+import time
+import timeit
+
+from src.mybootstrap_core_itskovichanton.utils import singleton, calc_hash, get_method_name
+
+N = 200_000
+
+_legacy_cache = {}
+_legacy_timestamps = {}
+
+
+def legacy_singleton(ttl=None):
+    # реализация @singleton до появления TTLCache - ключ строится заново на каждом вызове
+    def decorator(func):
+        @functools.wraps(func)
+        def sync_wrapper(*args, **kwargs):
+            key = args
+            if kwargs:
+                key += (frozenset(kwargs.items()),)
+            key = tuple(calc_hash(k) for k in key + (get_method_name(func),))
+            if key in _legacy_timestamps:
+                if ttl is not None and 0 < ttl < (time.time() - _legacy_timestamps[key]):
+                    del _legacy_cache[key]
+                    del _legacy_timestamps[key]
+            if key not in _legacy_cache:
+                _legacy_cache[key] = func(*args, **kwargs)
+                _legacy_timestamps[key] = time.time()
+            return _legacy_cache[key]
+
+        return sync_wrapper
+
+    return decorator
+
+
+class Exporter:
+
+    @legacy_singleton()
+    def legacy_gauge_name(self, metric_name):
+        return f"app_{metric_name}"
+
+    @singleton
+    def gauge_name(self, metric_name):
+        return f"app_{metric_name}"
+
+    @legacy_singleton(ttl=300)
+    def legacy_ttl(self, url, timeout=3):
+        return url
+
+    @singleton(ttl=300)
+    def ttl(self, url, timeout=3):
+        return url
+
+
+def per_call_ns(stmt) -> float:
+    stmt()
+    return min(timeit.repeat(stmt, number=N, repeat=5)) / N * 1e9
+
+
+def main():
+    e = Exporter()
+    cases = [
+        ("positional, no ttl", lambda: e.legacy_gauge_name("requests"), lambda: e.gauge_name("requests")),
+        ("kwargs, ttl", lambda: e.legacy_ttl("http://x", timeout=3), lambda: e.ttl("http://x", timeout=3)),
+    ]
+    print(f"{'case':<24}{'before, ns':>12}{'after, ns':>12}{'speedup':>10}")
+    for name, before, after in cases:
+        b = per_call_ns(before)
+        a = per_call_ns(after)
+        print(f"{name:<24}{b:>12.0f}{a:>12.0f}{b / a:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
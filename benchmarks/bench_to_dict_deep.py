@@ -0,0 +1,139 @@
+"""
+to_dict_deep на деревьях dataclass: исходная реализация против планов сериализации
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_to_dict_deep
+"""
+import timeit
+from dataclasses import dataclass, field
+from datetime import datetime
+from enum import Enum
+from typing import Any, Callable, List, Set, Tuple
+
+from src.mybootstrap_core_itskovichanton.structures import CaseInsensitiveDict
+from src.mybootstrap_core_itskovichanton.utils import to_dict_deep, to_dict, is_standard_value_object, trim_string
+
+
+def legacy_to_dict_deep(obj, route=(),
+                        is_value_object: Callable[[tuple, str], bool] = None,
+                        key_mapper: Callable[[tuple, str], str] = lambda _, x: x,
+                        value_mapper: Callable[[tuple, Any], Any] = lambda _, x: x):
+    # to_dict_deep до появления планов - структура выясняется заново на каждом узле
+    if obj is None:
+        return None
+    if isinstance(obj, Enum):
+        return value_mapper(route, obj.value)
+    if (is_value_object and is_value_object(route, obj)) or callable(obj):
+        return value_mapper(route, obj)
+    if not isinstance(obj, dict) and ((not obj) or is_standard_value_object(obj)):
+        return value_mapper(route, obj)
+    if isinstance(obj, (List, Set, Tuple)):
+        return [legacy_to_dict_deep(x, route, is_value_object, key_mapper, value_mapper) for x in list(obj)]
+    r = None
+    if isinstance(obj, CaseInsensitiveDict):
+        obj = dict(obj)
+    try:
+        for attr, value in to_dict(obj).items():
+            if value is None or attr.startswith("_"):
+                continue
+            new_route = (*route, attr)
+            attr = key_mapper(new_route, attr)
+            if (is_value_object and is_value_object(route, value)) or callable(value) or is_standard_value_object(
+                    value):
+                value = value_mapper(route, value)
+                if not r:
+                    r = {}
+                r.setdefault(attr, value)
+            elif isinstance(value, (List, Set, Tuple)):
+                value = [legacy_to_dict_deep(x, new_route, is_value_object, key_mapper, value_mapper) for x in value]
+                if not r:
+                    r = {}
+                r.setdefault(attr, value)
+            else:
+                try:
+                    value = legacy_to_dict_deep(value, new_route, is_value_object, key_mapper, value_mapper)
+                    if not r:
+                        r = {}
+                    r.setdefault(attr, value)
+                except BaseException as e1:
+                    print("attr: ", attr, "\terror: ", e1)
+        return r
+    except BaseException as e:
+        print("out of for\t")
+        print("error: ", e)
+        return value_mapper(route, obj)
+
+
+class Level(Enum):
+    INFO = 1
+    ERROR = 2
+
+
+@dataclass
+class Header:
+    name: str = "content-type"
+    value: str = "application/json"
+    _raw: bytes = b""
+
+
+@dataclass
+class Item:
+    id: int = 0
+    title: str = "item"
+    price: float = 9.99
+    created: datetime = field(default_factory=datetime.now)
+    level: Level = Level.INFO
+    note: str = None
+    headers: list = field(default_factory=lambda: [Header(), Header("x-request-id", "42")])
+
+
+@dataclass
+class Order:
+    id: int = 0
+    customer: str = "customer"
+    items: list = field(default_factory=list)
+    meta: dict = field(default_factory=lambda: {"source": "api", "attempt": 1})
+    parent: "Order" = None
+
+
+def make_tree(depth: int, width: int) -> Order:
+    o = Order(id=depth, items=[Item(id=i) for i in range(width)])
+    if depth > 0:
+        o.parent = make_tree(depth - 1, width)
+    return o
+
+
+def per_call_us(stmt, number) -> float:
+    stmt()
+    return min(timeit.repeat(stmt, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    trim = lambda _, v: trim_string(v, limit=3000) if type(v) == str else v
+    cases = [
+        ("flat, 5 items", make_tree(0, 5), 2000),
+        ("depth 5, 10 items", make_tree(5, 10), 200),
+        ("depth 20, 20 items", make_tree(20, 20), 20),
+    ]
+    # как в SimpleJsonFormatter: trim и бюджеты по умолчанию (у исходной реализации бюджетов нет)
+    formatter_budgets = {"max_depth": 32, "max_items": 500, "max_bytes": 256 * 1024}
+    print(f"{'case':<22}{'mapper':<12}{'before, us':>12}{'after, us':>12}{'speedup':>10}")
+    for name, tree, number in cases:
+        assert legacy_to_dict_deep(tree, value_mapper=trim) == to_dict_deep(tree, value_mapper=trim)
+        for mapper_name, kw, budgets in (("none", {}, {}), ("trim", {"value_mapper": trim}, {}),
+                                         ("formatter", {"value_mapper": trim}, formatter_budgets)):
+            b = per_call_us(lambda: legacy_to_dict_deep(tree, **kw), number)
+            a = per_call_us(lambda: to_dict_deep(tree, **kw, **budgets), number)
+            print(f"{name:<22}{mapper_name:<12}{b:>12.1f}{a:>12.1f}{b / a:>9.1f}x")
+
+    # бюджеты: стоимость пропорциональна выводимому, а не размеру входа
+    big = {"rows": [make_tree(0, 5) for _ in range(2000)]}
+    print()
+    print(f"{'budget':<30}{'time, us':>12}")
+    for name, kw in (("none", {}), ("max_items=50", {"max_items": 50}), ("max_bytes=64KB", {"max_bytes": 64 * 1024}),
+                     ("max_depth=2", {"max_depth": 2})):
+        print(f"{name:<30}{per_call_us(lambda: to_dict_deep(big, value_mapper=trim, **kw), 5):>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
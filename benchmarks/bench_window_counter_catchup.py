@@ -0,0 +1,75 @@
+"""
+Первый add() после простоя: посегментный сдвиг кольца против очистки срезами
+
+Окно 1 час с разрешением 0.01 с (360001 сегмент), простои разной длины.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_window_counter_catchup
+"""
+import asyncio
+import time
+from datetime import timedelta
+
+from src.mybootstrap_core_itskovichanton.stats.async_circular_window_counter import AsyncCircularWindowCounter
+from src.mybootstrap_core_itskovichanton.stats.sync_circular_window_counter import CircularWindowCounter, \
+    NumpyCircularWindowCounter
+
+WINDOW = timedelta(hours=1)
+RESOLUTION = 0.01
+GAPS = (0.05, 1, 10, 60, 600, 3600, 7200)
+
+
+class LegacyCircularWindowCounter(CircularWindowCounter):
+    # как было: сдвиг на каждый сегмент в цикле Python
+    def _update_index(self, now: float) -> int:
+        delta = now - self._last_update
+        steps = int(delta / self.resolution)
+        if steps <= 0:
+            return self._index
+        max_steps = min(steps, self.buffer_size)
+        for _ in range(max_steps):
+            self._index = (self._index + 1) % self.buffer_size
+            self._total -= self._buffer[self._index]
+            self._buffer[self._index] = 0
+        self._last_update = now + (steps - max_steps) * self.resolution
+        return self._index
+
+
+def catchup_ms(counter, gap: float, repeat: int = 3) -> float:
+    # простой имитируется сдвигом времени последнего обновления назад
+    best = None
+    for _ in range(repeat):
+        counter._update_index(time.monotonic())
+        counter._last_update -= gap
+        start = time.perf_counter()
+        counter._update_index(time.monotonic())
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1e3
+
+
+async def make_async_counter():
+    return AsyncCircularWindowCounter(WINDOW, RESOLUTION, auto_cleanup=False)
+
+
+def main():
+    counters = {
+        "legacy": LegacyCircularWindowCounter(WINDOW, RESOLUTION),
+        "array": CircularWindowCounter(WINDOW, RESOLUTION),
+        "numpy": NumpyCircularWindowCounter(WINDOW, RESOLUTION),
+        "async": asyncio.run(make_async_counter()),
+    }
+    for c in counters.values():
+        # заполненное окно: очистке есть что вычитать
+        for i in range(c.buffer_size):
+            c._buffer[i] = 1
+        c._total = c.buffer_size
+
+    print(f"window={WINDOW}, resolution={RESOLUTION}s, {counters['array'].buffer_size} slots")
+    print(f"{'idle gap, s':<14}" + "".join(f"{name + ', ms':>14}" for name in counters))
+    for gap in GAPS:
+        print(f"{gap:<14}" + "".join(f"{catchup_ms(c, gap):>14.3f}" for c in counters.values()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Запись в один оконный счетчик из N потоков: CircularWindowCounter (общая блокировка)
+против ShardedCircularWindowCounter (кольцо на поток)
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_window_counter_contention
+"""
+import threading
+import time
+from datetime import timedelta
+
+from src.mybootstrap_core_itskovichanton.stats.sync_circular_window_counter import CircularWindowCounter, \
+    ShardedCircularWindowCounter
+
+WINDOW = timedelta(minutes=1)
+ADDS_PER_THREAD = 200_000
+
+
+def run(counter, threads: int) -> float:
+    """Миллионов add() в секунду по всем потокам"""
+    start_barrier = threading.Barrier(threads + 1)
+
+    def worker():
+        add = counter.add
+        start_barrier.wait()
+        for _ in range(ADDS_PER_THREAD):
+            add()
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in pool:
+        t.start()
+    start_barrier.wait()
+    start = time.perf_counter()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+    assert counter.count() == threads * ADDS_PER_THREAD
+    return threads * ADDS_PER_THREAD / elapsed / 1e6
+
+
+def main():
+    print(f"{ADDS_PER_THREAD} add() per thread")
+    print(f"{'threads':<10}{'locked, M/s':>14}{'sharded, M/s':>15}{'speedup':>10}")
+    for threads in (1, 2, 4, 8, 16):
+        locked = max(run(CircularWindowCounter(WINDOW), threads) for _ in range(3))
+        sharded = max(run(ShardedCircularWindowCounter(WINDOW), threads) for _ in range(3))
+        print(f"{threads:<10}{locked:>14.2f}{sharded:>15.2f}{sharded / locked:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+CircularWindowCounter против NumpyCircularWindowCounter: add_at, сдвиг кольца, одиночный add
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_window_counter_numpy
+"""
+import random
+import time
+import timeit
+from datetime import timedelta
+
+import numpy as np
+
+from src.mybootstrap_core_itskovichanton.stats.sync_circular_window_counter import CircularWindowCounter, \
+    NumpyCircularWindowCounter
+
+WINDOW = timedelta(minutes=10)
+RESOLUTION = 0.01
+
+
+def per_call_ms(stmt, number) -> float:
+    stmt()
+    return min(timeit.repeat(stmt, number=number, repeat=5)) / number * 1e3
+
+
+def events(n: int, spread: float) -> tuple[np.ndarray, np.ndarray]:
+    # n событий за последние spread секунд
+    rnd = random.Random(n)
+    now = time.monotonic()
+    ts = np.array([now - rnd.uniform(0, spread) for _ in range(n)])
+    counts = np.array([rnd.randint(1, 10) for _ in range(n)], dtype=np.int64)
+    return ts, counts
+
+
+def shift(counter, gap: float):
+    counter._last_update -= gap
+    counter._update_index(time.monotonic())
+
+
+def main():
+    array_counter = CircularWindowCounter(WINDOW, RESOLUTION)
+    numpy_counter = NumpyCircularWindowCounter(WINDOW, RESOLUTION)
+    print(f"window={WINDOW}, resolution={RESOLUTION}s, {array_counter.buffer_size} slots")
+    print(f"{'case':<34}{'array, ms':>12}{'numpy, ms':>12}{'speedup':>10}")
+
+    def row(name, a, n):
+        print(f"{name:<34}{a:>12.3f}{n:>12.3f}{a / n:>9.1f}x")
+
+    for n, spread in ((1_000, 1), (100_000, 10), (1_000_000, 60)):
+        ts, counts = events(n, spread)
+        ts_list, counts_list = ts.tolist(), counts.tolist()
+        number = 3 if n >= 100_000 else 50
+        row(f"add_at {n} events over {spread}s",
+            per_call_ms(lambda: array_counter.add_at(ts_list, counts_list), number),
+            per_call_ms(lambda: numpy_counter.add_at(ts, counts), number))
+
+    for gap in (1, 60, 300):
+        row(f"ring shift after {gap}s idle",
+            per_call_ms(lambda: shift(array_counter, gap), 20),
+            per_call_ms(lambda: shift(numpy_counter, gap), 20))
+
+    row("single add()", per_call_ms(array_counter.add, 100_000), per_call_ms(numpy_counter.add, 100_000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+import asyncio
+import time
+
+import httpx
+
+from src.mybootstrap_core_itskovichanton.availability import availability_prober
+from src.mybootstrap_core_itskovichanton.logger import ExchangeRecorder, Exchange, SessionStats
+from src.mybootstrap_core_itskovichanton.utils import generate_uid
+
+
+class AsyncSessionWithStats(ExchangeRecorder, httpx.AsyncClient):
+    """
+    httpx.AsyncClient со статистикой и логом запросов в том же формате, что у SessionWithStats
+
+    Все запросы клиента идут через один пул соединений (limits). Ответы stream=True
+    учитываются по мере чтения - статистика и лог дописываются при aclose.
+    """
+
+    def __init__(self, name, logger=None, url=None, route=None, error_words_detectors=None, capture=None,
+                 limits: httpx.Limits = None, **kwargs):
+        super().__init__(limits=limits or httpx.Limits(max_connections=100, max_keepalive_connections=20),
+                         **kwargs)
+        self._init_recorder(name, logger, url, route, error_words_detectors, capture)
+
+    @property
+    def stats(self) -> SessionStats:
+        r = SessionStats(stats=self.stats_summary())
+        if self._url:
+            r.set_availability(availability_prober.snapshot(self._url))
+        return r
+
+    async def aclose(self) -> None:
+        await super().aclose()
+        self._close_recorder()
+
+    async def send(self, request: httpx.Request, *, stream: bool = False, **kwargs) -> httpx.Response:
+        if self.name:
+            request.headers["User-Agent"] = self.name
+        request.headers["X-Request-ID"] = generate_uid()
+
+        start = time.perf_counter()
+        exc = None
+        response = None
+        try:
+            response = await super().send(request, stream=stream, **kwargs)
+            return response
+        except (asyncio.CancelledError, KeyboardInterrupt, SystemExit):
+            # запрос отменен, а не сорвался: в статистику и лог не попадает
+            exc = _CANCELLED
+            raise
+        except BaseException as e:
+            exc = e
+            raise
+        finally:
+            if exc is not _CANCELLED:
+                self._record(request, response, exc, start, stream)
+
+    def _record(self, request: httpx.Request, response: httpx.Response, exc, start: float, stream: bool):
+        elapsed = time.perf_counter() - start
+        url = str(request.url)
+        route = self.route_of(url)
+        try:
+            req_body = request.content
+        except httpx.RequestNotRead:
+            req_body = None
+
+        exchange = Exchange(request.method, url, request.headers, req_body,
+                            _ResponseView(response) if response is not None else None, exc, start, elapsed)
+        if stream and response is not None:
+            # тело еще не прочитано: статистику и лог дополним при закрытии ответа
+            self._update_stats(route, exchange, read_body=False)
+            response.stream = _AsyncStreamCapture(self, route, exchange, response.stream)
+        else:
+            self._complete(route, exchange)
+
+
+_CANCELLED = object()
+
+
+class _ResponseView:
+    # ответ httpx в виде, который ожидает ExchangeRecorder (как у requests.Response)
+
+    def __init__(self, response: httpx.Response):
+        self._response = response
+        self.status_code = response.status_code
+        self.reason = response.reason_phrase
+        self.url = str(response.url)
+        self.headers = response.headers
+
+    @property
+    def content(self):
+        return self._response.content
+
+
+class _AsyncStreamCapture(httpx.AsyncByteStream):
+    """Поток тела ответа, считающий байты и время и хранящий начало тела для лога"""
+
+    def __init__(self, session: AsyncSessionWithStats, route, exchange: Exchange, stream):
+        self.session = session
+        self.route = route
+        self.x = exchange
+        self.stream = stream
+        self.limit = session.capture_policy(route).max_body_bytes or 0
+        self.prefix = bytearray()
+        self.bytes = 0
+        self.first_byte_at = None
+        self.last_byte_at = None
+        self.done = False
+
+    async def __aiter__(self):
+        async for chunk in self.stream:
+            now = time.perf_counter()
+            if self.first_byte_at is None:
+                self.first_byte_at = now
+            self.last_byte_at = now
+            self.bytes += len(chunk)
+            room = self.limit - len(self.prefix)
+            if room > 0:
+                self.prefix += chunk[:room]
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self.stream.aclose()
+        finally:
+            self.finish()
+
+    def finish(self):
+        if self.done:
+            return
+        self.done = True
+        x = self.x
+        x.set_streamed(bytes(self.prefix), self.bytes, self.first_byte_at, self.last_byte_at)
+        self.prefix = None
+        err_words_found = self.session._update_stats(self.route, x, read_body=False)
+        self.session._log_exchange(self.route, x, err_words_found)
@@ -0,0 +1,190 @@
+import threading
+import time
+import traceback
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import requests
+
+from src.mybootstrap_core_itskovichanton.utils import UrlCheckResult, check_url_availability_by_url
+
+
+@dataclass
+class ProbeRecord:
+    checked_at: float
+    status: str = None
+    response_time_ms: float = None
+    error: str = None
+
+
+@dataclass
+class AvailabilitySnapshot:
+    result: UrlCheckResult = None
+    checked_at: float = None
+    age_sec: float = None
+    history: list[ProbeRecord] = field(default_factory=list)
+
+
+class _Target:
+    __slots__ = ("url", "owners", "http", "result", "checked_at", "history", "probing")
+
+    def __init__(self, url, history_size):
+        self.url = url
+        # сессии, которым нужен url; None - зарегистрирован без владельца и живет до unregister
+        self.owners: weakref.WeakSet = None
+        # собственная сессия проверок: запросы проверки не попадают в статистику и лог владельцев
+        self.http: requests.Session = None
+        self.result: UrlCheckResult = None
+        self.checked_at: float = None
+        self.history = deque(maxlen=history_size)
+        self.probing = False
+
+
+class AvailabilityProber:
+    """
+    Фоновая проверка доступности URL по расписанию
+
+    Все зарегистрированные URL проверяются параллельно раз в interval секунд;
+    snapshot() сразу возвращает последний результат, его возраст и историю, не дожидаясь
+    проверки. Поток проверок запускается при первой регистрации.
+
+    Проверки идут через отдельный простой requests.Session (прокси, verify и cert копируются
+    у сессии-владельца), поэтому не пишутся в статистику и лог логируемых сессий.
+    URL перестает проверяться, когда все его владельцы закрыты или собраны сборщиком мусора.
+
+    Args:
+        check: функция (url, session) -> UrlCheckResult, session - сессия проверок
+        history_size: сколько последних проверок помнить
+    """
+
+    def __init__(self, interval: float = 60, history_size: int = 20, max_workers: int = 16,
+                 check=None):
+        self.interval = interval
+        self.history_size = history_size
+        self.max_workers = max_workers
+        self.check = check or (lambda url, session: check_url_availability_by_url(url, session=session))
+        self._targets: dict[str, _Target] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._executor = None
+
+    def register(self, url: str, session=None):
+        """Включить url в проверки; session - владелец, пока он жив, url проверяется"""
+        with self._lock:
+            target = self._targets.get(url)
+            if target is None:
+                target = self._targets[url] = _Target(url, self.history_size)
+                if session is not None:
+                    target.owners = weakref.WeakSet()
+                # новый URL проверяем сразу, не дожидаясь очередного цикла
+                self._wakeup.set()
+            if session is None:
+                target.owners = None
+            elif target.owners is not None:
+                target.owners.add(session)
+            if target.http is None:
+                target.http = _probe_session(session)
+            if self._thread is None or not self._thread.is_alive():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix="availability-probe")
+                self._thread = threading.Thread(target=self._run, name="availability-prober", daemon=True)
+                self._thread.start()
+
+    def unregister(self, url: str, session=None):
+        """Исключить url из проверок; с session - только если у url не осталось других владельцев"""
+        with self._lock:
+            target = self._targets.get(url)
+            if target is None:
+                return
+            if session is not None and target.owners is not None:
+                target.owners.discard(session)
+                if target.owners:
+                    return
+            elif session is not None:
+                return
+            self._drop(target)
+
+    def _drop(self, target: _Target):
+        del self._targets[target.url]
+        if target.http is not None:
+            target.http.close()
+
+    def snapshot(self, url: str) -> AvailabilitySnapshot:
+        target = self._targets.get(url)
+        if target is None:
+            return AvailabilitySnapshot()
+        checked_at = target.checked_at
+        return AvailabilitySnapshot(result=target.result, checked_at=checked_at,
+                                    age_sec=(time.time() - checked_at) if checked_at is not None else None,
+                                    history=list(target.history))
+
+    def probe_now(self, wait: float = None) -> bool:
+        """Проверить все URL вне расписания; wait - сколько ждать результатов"""
+        if self._executor is None:
+            return True
+        futures = self._probe_all()
+        deadline = None if wait is None else time.monotonic() + wait
+        for f in futures:
+            try:
+                f.result(None if deadline is None else max(0.0, deadline - time.monotonic()))
+            except Exception:
+                return False
+        return True
+
+    def _probe_all(self, only_new: bool = False) -> list:
+        with self._lock:
+            for t in list(self._targets.values()):
+                if t.owners is not None and not t.owners:
+                    # владельцы собраны сборщиком мусора без unregister
+                    self._drop(t)
+            targets = [t for t in self._targets.values()
+                       if not t.probing and not (only_new and t.checked_at is not None)]
+            for t in targets:
+                # медленная проверка не накладывается на саму себя в следующем цикле
+                t.probing = True
+        return [self._executor.submit(self._probe, t) for t in targets]
+
+    def _probe(self, target: _Target):
+        try:
+            try:
+                r = self.check(target.url, target.http)
+            except BaseException as e:
+                r = UrlCheckResult(host=None, port=None, status="unavailable", error=str(e))
+            now = time.time()
+            target.result = r
+            target.checked_at = now
+            target.history.append(ProbeRecord(checked_at=now, status=r.status, response_time_ms=r.response_time_ms,
+                                              error=r.error))
+        finally:
+            target.probing = False
+
+    def _run(self):
+        next_round = 0
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            full = now >= next_round
+            if full:
+                next_round = now + self.interval
+            try:
+                # между плановыми циклами (разбудила регистрация) проверяем только новые URL
+                self._probe_all(only_new=not full)
+            except BaseException:
+                traceback.print_exc()
+            self._wakeup.wait(max(0.0, next_round - time.monotonic()))
+
+
+def _probe_session(owner) -> requests.Session:
+    r = requests.Session()
+    if isinstance(owner, requests.Session):
+        r.proxies = dict(owner.proxies)
+        r.verify = owner.verify
+        r.cert = owner.cert
+        r.trust_env = owner.trust_env
+    return r
+
+
+availability_prober = AvailabilityProber()
@@ -0,0 +1,459 @@
+import asyncio
+import pickle
+import threading
+import time
+import traceback
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Hashable
+
+MISSING = object()
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    stale_hits: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def summary(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "stale_hits": self.stale_hits,
+            "hit_ratio": self.hit_ratio,
+        }
+
+
+class TTLCache:
+    """
+    LRU-кэш с ограничением размера и временем жизни записей
+
+    Особенности:
+    - O(1) чтение и запись
+    - При переполнении вытесняется запись, к которой дольше всего не обращались
+    - Просроченные записи удаляются амортизированно: каждая запись в кэш
+      просматривает не более sweep_batch самых старых записей
+    - Очередь истечения сжимается, когда устаревших отметок (перезапись, вытеснение,
+      удаление) в ней становится больше, чем живых записей - ее размер ограничен max_size
+    - Просроченная запись может еще stale_ttl секунд отдаваться через get_stale
+    - Опциональный вторичный индекс (index_key) позволяет удалять группу записей
+      за время, пропорциональное размеру группы, а не всего кэша
+    - Потокобезопасный; попадание в get не берет блокировку, поэтому
+      счетчики статистики при гонках приблизительны
+    """
+
+    def __init__(self, name: str = None, max_size: int = None, ttl: float = None, sweep_batch: int = 16,
+                 stale_ttl: float = None, index_key: Callable[[Hashable], Hashable | None] = None):
+        """
+        Args:
+            name: Имя кэша (для статистики)
+            max_size: Максимальное количество записей, None - без ограничения
+            ttl: Время жизни записи в секундах, None или <= 0 - бессрочно
+            sweep_batch: Сколько просроченных записей удалять за одну вставку
+            stale_ttl: Сколько секунд после истечения ttl запись еще хранится для get_stale
+            index_key: Функция ключ -> группа для remove_group (None - запись не индексируется)
+        """
+        self.name = name
+        self.max_size = max_size if max_size and max_size > 0 else None
+        self.ttl = ttl if ttl and ttl > 0 else None
+        self.stale_ttl = stale_ttl if stale_ttl and stale_ttl > 0 else 0
+        self.sweep_batch = sweep_batch
+        self.stats = CacheStats()
+
+        # key -> (value, expires_at)
+        self._data = OrderedDict()
+        # (expires_at, key) в порядке вставки - при одинаковом ttl это и порядок истечения
+        self._expiry = deque()
+        self._index_key = index_key
+        # группа -> ключи группы
+        self._index: dict[Hashable, set] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default=MISSING):
+        # попадание обслуживается без блокировки: чтение dict и move_to_end атомарны под GIL
+        entry = self._data.get(key)
+        if entry is not None and (entry[1] is None or entry[1] > time.monotonic()):
+            if self.max_size:
+                try:
+                    self._data.move_to_end(key)
+                except KeyError:
+                    pass
+            self.stats.hits += 1
+            return entry[0]
+
+        with self._lock:
+            now = time.monotonic()
+            entry = self._lookup(key, now)
+            if entry is None or (entry[1] is not None and entry[1] <= now):
+                self.stats.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.stats.hits += 1
+            return entry[0]
+
+    def get_stale(self, key: Hashable, default=MISSING) -> tuple[Any, bool]:
+        """
+        Получить значение, даже если его ttl истек (но не истек stale_ttl)
+
+        Returns:
+            tuple: (значение, признак свежести)
+        """
+        now = time.monotonic() if self.ttl else 0.0
+        with self._lock:
+            entry = self._lookup(key, now)
+            if entry is None:
+                self.stats.misses += 1
+                return default, False
+            self._data.move_to_end(key)
+            self.stats.hits += 1
+            fresh = entry[1] is None or entry[1] > now
+            if not fresh:
+                self.stats.stale_hits += 1
+            return entry[0], fresh
+
+    def peek(self, key: Hashable, default=MISSING):
+        """Получить свежее значение без учета в статистике и без изменения порядка вытеснения"""
+        entry = self._data.get(key)
+        if entry is None or (entry[1] is not None and entry[1] <= time.monotonic()):
+            return default
+        return entry[0]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        now = time.monotonic()
+        expires_at = now + self.ttl if self.ttl else None
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+            elif self._index_key:
+                self._add_to_index(key)
+            self._data[key] = (value, expires_at)
+            if expires_at is not None:
+                self._expiry.append((expires_at, key))
+                self._sweep(now, self.sweep_batch)
+            if self.max_size:
+                while len(self._data) > self.max_size:
+                    evicted, _ = self._data.popitem(last=False)
+                    self._remove_from_index(evicted)
+                    self.stats.evictions += 1
+            self._maybe_compact()
+
+    def delete(self, key: Hashable) -> bool:
+        with self._lock:
+            removed = self._remove(key)
+            self._maybe_compact()
+            return removed
+
+    def remove_group(self, group: Hashable) -> int:
+        """Удалить все записи группы (см. index_key) за O(размер группы)"""
+        with self._lock:
+            keys = self._index.pop(group, None)
+            if not keys:
+                return 0
+            for k in keys:
+                self._data.pop(k, None)
+            self._maybe_compact()
+            return len(keys)
+
+    def remove_if(self, predicate: Callable[[Hashable], bool]) -> int:
+        with self._lock:
+            keys_to_remove = [k for k in self._data if predicate(k)]
+            for k in keys_to_remove:
+                self._remove(k)
+            self._maybe_compact()
+            return len(keys_to_remove)
+
+    def sweep(self) -> int:
+        """Удалить все просроченные записи"""
+        with self._lock:
+            return self._sweep(time.monotonic(), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._expiry.clear()
+            self._index.clear()
+
+    def _lookup(self, key: Hashable, now: float):
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] + self.stale_ttl <= now:
+            self._remove(key)
+            self.stats.expirations += 1
+            return None
+        return entry
+
+    def _sweep(self, now: float, limit: int | None) -> int:
+        removed = 0
+        expiry = self._expiry
+        deadline = now - self.stale_ttl
+        while expiry and expiry[0][0] <= deadline and (limit is None or removed < limit):
+            expires_at, key = expiry.popleft()
+            entry = self._data.get(key)
+            # запись могла быть перезаписана или вытеснена - тогда отметка в очереди устарела
+            if entry is not None and entry[1] == expires_at:
+                self._remove(key)
+                self.stats.expirations += 1
+                removed += 1
+        return removed
+
+    def _maybe_compact(self) -> None:
+        # оставить в очереди только актуальные отметки: по одной на живую запись с ttl;
+        # сжатие происходит, когда устаревших не меньше половины, поэтому амортизированно O(1)
+        expiry = self._expiry
+        if len(expiry) <= 2 * len(self._data) + self.sweep_batch:
+            return
+        data = self._data
+        seen = set()
+        live = []
+        for expires_at, key in reversed(expiry):
+            entry = data.get(key)
+            if entry is not None and entry[1] == expires_at and key not in seen:
+                seen.add(key)
+                live.append((expires_at, key))
+        live.reverse()
+        self._expiry = deque(live)
+
+    def _remove(self, key: Hashable) -> bool:
+        if self._data.pop(key, MISSING) is MISSING:
+            return False
+        self._remove_from_index(key)
+        return True
+
+    def _add_to_index(self, key: Hashable) -> None:
+        group = self._index_key(key)
+        if group is not None:
+            keys = self._index.get(group)
+            if keys is None:
+                self._index[group] = keys = set()
+            keys.add(key)
+
+    def _remove_from_index(self, key: Hashable) -> None:
+        if not self._index_key:
+            return
+        group = self._index_key(key)
+        keys = self._index.get(group)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._index[group]
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._data.get(key)
+        return entry is not None and (entry[1] is None or entry[1] > time.monotonic())
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __repr__(self) -> str:
+        return f"<TTLCache name={self.name} size={len(self._data)} max_size={self.max_size} ttl={self.ttl}>"
+
+
+class RedisCacheTier:
+    """
+    Общий для нескольких процессов уровень кэша поверх Redis
+
+    Значения сериализуются serializer-ом (любой объект с dumps/loads: pickle, json, ...)
+    и хранятся под ключами "<prefix>:<namespace>:<key>" с собственным ttl.
+    Ошибки Redis и сериализации не пробрасываются - они считаются промахом.
+    """
+
+    def __init__(self, redis, prefix: str = "singleton", serializer=pickle):
+        """
+        Args:
+            redis: Клиент Redis или функция, возвращающая его (например, RedisService.get)
+            prefix: Префикс ключей
+            serializer: Объект с методами dumps/loads
+        """
+        self._redis = redis
+        self.prefix = prefix
+        self.serializer = serializer
+        self.stats = CacheStats()
+        self.errors = 0
+        self.last_error: str = None
+
+    @property
+    def client(self):
+        return self._redis() if callable(self._redis) else self._redis
+
+    def make_key(self, namespace: str, key: str) -> str:
+        return f"{self.prefix}:{namespace}:{key}"
+
+    def get(self, namespace: str, key: str, default=MISSING):
+        try:
+            raw = self.client.get(self.make_key(namespace, key))
+            if raw is None:
+                self.stats.misses += 1
+                return default
+            value = self.serializer.loads(raw)
+        except Exception as e:
+            self._on_error(e)
+            return default
+        self.stats.hits += 1
+        return value
+
+    def set(self, namespace: str, key: str, value: Any, ttl: float = None) -> None:
+        try:
+            raw = self.serializer.dumps(value)
+            if ttl and ttl > 0:
+                self.client.set(self.make_key(namespace, key), raw, px=int(ttl * 1000))
+            else:
+                self.client.set(self.make_key(namespace, key), raw)
+        except Exception as e:
+            self._on_error(e)
+
+    def clear(self, namespace: str = None) -> int:
+        """Удалить все ключи уровня или только ключи namespace"""
+        pattern = f"{self.prefix}:{namespace}:*" if namespace else f"{self.prefix}:*"
+        n = 0
+        try:
+            client = self.client
+            for k in client.scan_iter(match=pattern, count=500):
+                n += client.delete(k)
+        except Exception as e:
+            self._on_error(e)
+        return n
+
+    def _on_error(self, e: Exception):
+        self.errors += 1
+        self.last_error = str(e)
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Схлопывает конкурентные вычисления одного ключа в одно
+
+    Первый вызвавший do() для ключа выполняет функцию, остальные потоки
+    ждут его результата (или исключения) на событии этого ключа.
+
+    Пример:
+        flight = SingleFlight()
+        value = flight.do(key, lambda: load(key))
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def submit(self, key: Hashable, fn: Callable[[], Any], executor) -> bool:
+        """
+        Запустить fn в executor, если для ключа еще ничего не выполняется
+
+        Returns:
+            bool: True, если вычисление запущено этим вызовом
+        """
+        with self._lock:
+            if key in self._calls:
+                return False
+            self._calls[key] = _Call()
+
+        def run():
+            call = self._calls[key]
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+                traceback.print_exc()
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.event.set()
+
+        executor.submit(run)
+        return True
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._calls
+
+
+class AsyncSingleFlight:
+    """
+    Асинхронная версия SingleFlight
+
+    Вычисление ключа выполняется одной задачей, все корутины ожидают ее
+    через asyncio.shield - отмена одного ожидающего не отменяет вычисление.
+    """
+
+    def __init__(self):
+        self._tasks: dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        return await asyncio.shield(self._get_task(key, fn))
+
+    def submit(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> bool:
+        """
+        Запустить фоновую задачу, если для ключа еще ничего не выполняется
+
+        Returns:
+            bool: True, если задача создана этим вызовом
+        """
+        if self._running_task(key) is not None:
+            return False
+        task = self._get_task(key, fn)
+        task.add_done_callback(_report_task_error)
+        return True
+
+    def in_flight(self, key: Hashable) -> bool:
+        return self._running_task(key) is not None
+
+    def _running_task(self, key: Hashable) -> asyncio.Task | None:
+        task = self._tasks.get(key)
+        # задача другого цикла событий (например, из другого потока) не может быть разделена
+        if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+            return None
+        return task
+
+    def _get_task(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        task = self._running_task(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._tasks[key] = task
+            task.add_done_callback(lambda t: self._tasks.pop(key, None) if self._tasks.get(key) is t else None)
+        return task
+
+
+def _report_task_error(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        traceback.print_exception(task.exception())
@@ -38,7 +38,7 @@ class FRServiceImpl(FRService):
             return
 
         if not isinstance(a.msg, dict):
-            a.msg = to_dict_deep(a.msg)
+            a.msg = to_dict_deep(a.msg, max_bytes=4000)
 
         a.msg = trim_string(str(a.msg), 4000)
 
@@ -0,0 +1,257 @@
+import logging
+import logging.handlers
+import threading
+import time
+import traceback
+from collections import deque
+from dataclasses import dataclass
+
+OVERFLOW_BLOCK = "block"
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+OVERFLOW_SAMPLE = "sample"
+
+OVERFLOW_POLICIES = (OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST, OVERFLOW_SAMPLE)
+
+
+@dataclass
+class LogQueueStats:
+    depth: int = 0
+    max_depth: int = 0
+    enqueued: int = 0
+    written: int = 0
+    dropped: int = 0
+    sampled_out: int = 0
+    blocked: int = 0
+    batches: int = 0
+    errors: int = 0
+
+    def summary(self):
+        return {
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "sampled_out": self.sampled_out,
+            "blocked": self.blocked,
+            "batches": self.batches,
+            "errors": self.errors,
+        }
+
+
+class QueueLogHandler(logging.Handler):
+    """
+    Обработчик, который только кладет запись в очередь
+
+    Форматирование и запись в целевые обработчики выполняет отдельный поток-писатель,
+    пачками, с одним flush на пачку. Запись форматируется позже, чем создана,
+    поэтому изменяемые объекты в msg после логирования менять не следует.
+
+    Args:
+        handlers: целевые обработчики (например, TimedCompressedRotatingFileHandler)
+        capacity: размер очереди
+        overflow: что делать при заполненной очереди:
+            "block" - ждать места (не дольше block_timeout, затем запись отбрасывается),
+            "drop_oldest" - вытеснить самую старую запись,
+            "sample" - после заполнения на sample_watermark пропускать лишь каждую sample_every-ю
+                запись (ошибки - всегда, пока есть место), при полной очереди - отбрасывать
+        batch_size: сколько записей писатель забирает за раз
+    """
+
+    def __init__(self, handlers, capacity: int = 10000, overflow: str = OVERFLOW_BLOCK, batch_size: int = 256,
+                 block_timeout: float = None, sample_every: int = 10, sample_watermark: float = 0.8,
+                 name: str = None):
+        super().__init__()
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"unknown overflow policy: {overflow}, expected one of {OVERFLOW_POLICIES}")
+        if not isinstance(handlers, (list, tuple)):
+            handlers = [handlers]
+        self.handlers = list(handlers)
+        self.capacity = capacity
+        self.overflow = overflow
+        self.batch_size = batch_size
+        self.block_timeout = block_timeout
+        self.sample_every = max(1, sample_every)
+        self.sample_threshold = max(1, int(capacity * sample_watermark))
+        self.name = name
+        self._stats = LogQueueStats()
+        self._queue = deque()
+        self._cond = threading.Condition(threading.Lock())
+        self._sample_counter = 0
+        # записи, забранные писателем, но еще не записанные - для flush()
+        self._in_progress = 0
+        self._closed = False
+        # писатель завершился - ждать его бессмысленно
+        self._dead = False
+        self._writer = threading.Thread(target=self._run, name=f"log-writer:{name or id(self)}", daemon=True)
+        self._writer.start()
+
+    @property
+    def stats(self) -> LogQueueStats:
+        with self._cond:
+            self._stats.depth = len(self._queue)
+            return LogQueueStats(**self._stats.__dict__)
+
+    def emit(self, record):
+        self.enqueue(record)
+
+    def handle(self, record):
+        # в отличие от logging.Handler.handle - без блокировки обработчика на время emit
+        rv = self.filter(record)
+        if rv:
+            self.enqueue(record)
+        return rv
+
+    def enqueue(self, record) -> bool:
+        q = self._queue
+        st = self._stats
+        with self._cond:
+            if self._closed or not self._writer_alive():
+                st.dropped += 1
+                return False
+            if len(q) >= self.sample_threshold and self.overflow == OVERFLOW_SAMPLE and len(q) < self.capacity:
+                self._sample_counter += 1
+                if record.levelno < logging.ERROR and self._sample_counter % self.sample_every:
+                    st.sampled_out += 1
+                    return False
+            if len(q) >= self.capacity:
+                if self.overflow == OVERFLOW_DROP_OLDEST:
+                    q.popleft()
+                    st.dropped += 1
+                elif self.overflow == OVERFLOW_BLOCK:
+                    st.blocked += 1
+                    deadline = None if self.block_timeout is None else time.monotonic() + self.block_timeout
+                    while len(q) >= self.capacity and not self._closed and self._writer_alive():
+                        timeout = None if deadline is None else deadline - time.monotonic()
+                        if timeout is not None and timeout <= 0:
+                            break
+                        # писатель мог умереть не уведомив - перепроверяем периодически
+                        self._cond.wait(1.0 if timeout is None else min(timeout, 1.0))
+                    if len(q) >= self.capacity or self._closed or not self._writer_alive():
+                        st.dropped += 1
+                        return False
+                else:
+                    st.dropped += 1
+                    return False
+            q.append(record)
+            st.enqueued += 1
+            if len(q) > st.max_depth:
+                st.max_depth = len(q)
+            if len(q) == 1:
+                self._cond.notify_all()
+        return True
+
+    def _writer_alive(self) -> bool:
+        return not self._dead and self._writer.is_alive()
+
+    def flush(self, timeout: float = None):
+        """Дождаться, пока писатель запишет все, что уже в очереди; False - не записано"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._queue or self._in_progress:
+                if not self._writer_alive():
+                    return False
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(1.0 if remaining is None else min(remaining, 1.0))
+        return True
+
+    def close(self, timeout: float = 10):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        # писатель дописывает очередь и завершается
+        self._writer.join(timeout)
+        for h in self.handlers:
+            try:
+                h.close()
+            except Exception:
+                pass
+        super().close()
+
+    def _run(self):
+        try:
+            self._loop()
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            with self._cond:
+                self._dead = True
+                self._in_progress = 0
+                # производители не должны ждать места, которое уже не освободится
+                self._cond.notify_all()
+
+    def _loop(self):
+        q = self._queue
+        cond = self._cond
+        while True:
+            with cond:
+                while not q and not self._closed:
+                    cond.wait()
+                if not q:
+                    return
+                n = min(len(q), self.batch_size)
+                batch = [q.popleft() for _ in range(n)]
+                self._in_progress = n
+                # освободилось место для заблокированных производителей
+                cond.notify_all()
+            errors = 0
+            for h in self.handlers:
+                try:
+                    errors += _write_batch(h, batch)
+                except BaseException:
+                    errors += len(batch)
+            with cond:
+                self._in_progress = 0
+                self._stats.written += len(batch)
+                self._stats.batches += 1
+                self._stats.errors += errors
+                cond.notify_all()
+
+
+def _write_batch(handler: logging.Handler, batch: list) -> int:
+    errors = 0
+    if not isinstance(handler, logging.StreamHandler):
+        for record in batch:
+            if record.levelno >= handler.level:
+                try:
+                    handler.handle(record)
+                except BaseException:
+                    errors += 1
+                    _handle_error(handler, record)
+        return errors
+
+    rotating = isinstance(handler, logging.handlers.BaseRotatingHandler)
+    handler.acquire()
+    try:
+        for record in batch:
+            if record.levelno < handler.level or not handler.filter(record):
+                continue
+            try:
+                if rotating and handler.shouldRollover(record):
+                    handler.doRollover()
+                if handler.stream is None:
+                    handler.stream = handler._open()
+                handler.stream.write(handler.format(record) + handler.terminator)
+            except BaseException:
+                # ни одна запись не должна останавливать писателя
+                errors += 1
+                _handle_error(handler, record)
+        try:
+            if handler.stream is not None:
+                handler.stream.flush()
+        except BaseException:
+            errors += 1
+    finally:
+        handler.release()
+    return errors
+
+
+def _handle_error(handler: logging.Handler, record):
+    try:
+        handler.handleError(record)
+    except BaseException:
+        pass
@@ -0,0 +1,388 @@
+import calendar
+import glob
+import gzip
+import heapq
+import logging
+import os
+import shutil
+import threading
+import time
+import traceback
+import zipfile
+from collections import deque, OrderedDict
+from typing import Callable
+
+PARTIAL_MARK = ".partial"
+
+ARCHIVE_TYPES = ("zip", "rar", "gz", "zst")
+
+# форматы, в которые лог пишется сразу сжатым потоком
+STREAMING_ARCHIVE_TYPES = ("gz", "zst")
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+
+def archive_path(file: str, archive_type: str) -> str:
+    return f"{file}.{archive_type}"
+
+
+def partial_path(file: str, archive_type: str) -> str:
+    # недописанный архив: после сбоя удаляется, исходный файл сжимается заново
+    return f"{file}{PARTIAL_MARK}.{archive_type}"
+
+
+def compress_file(file: str, archive_type: str = "zip") -> str:
+    """
+    Сжать файл ротации и удалить оригинал
+
+    Архив пишется во временный файл и переименовывается только целиком, а оригинал
+    удаляется последним - сбой на любом шаге оставляет как минимум исходный файл.
+
+    Returns:
+        str: путь к архиву
+    """
+    target = archive_path(file, archive_type)
+    tmp = partial_path(file, archive_type)
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    if archive_type == "rar":
+        import patoolib
+        patoolib.create_archive(tmp, [file], program='rar', verbosity=-1)
+    elif archive_type == "gz":
+        with open(file, "rb") as src, gzip.GzipFile(tmp, mode="wb") as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+    elif archive_type == "zst":
+        with open(file, "rb") as src, open(tmp, "wb") as dst:
+            zstandard.ZstdCompressor(level=3).copy_stream(src, dst)
+    else:
+        with zipfile.ZipFile(tmp, "w") as z:
+            z.write(file, os.path.basename(file), zipfile.ZIP_DEFLATED)
+    _fsync(tmp)
+    os.replace(tmp, target)
+    os.remove(file)
+    return target
+
+
+def _fsync(file: str):
+    try:
+        fd = os.open(file, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def resolve_streaming_archive_type(archive_type: str) -> str:
+    if archive_type == "zst" and zstandard is None:
+        logger.warning("zstandard is not installed, falling back to gz log compression")
+        return "gz"
+    return archive_type
+
+
+class CompressedLogStream:
+    """
+    Текстовый поток, сжимающий записанное на лету (gzip или zstd)
+
+    Дописывание в существующий файл добавляет новый gzip-член/zstd-фрейм - такие файлы
+    читаются zcat/zstdcat целиком. flush сбрасывает сжатые данные на диск не чаще раза в
+    flush_interval секунд, чтобы частые flush не портили степень сжатия. Сам поток flush
+    не вызывает: хвост, записанный перед затишьем, сбрасывает владелец потока
+    (TimedCompressedRotatingFileHandler - по таймеру rollover_worker) через flush(force=True).
+    """
+
+    def __init__(self, path: str, archive_type: str = "gz", encoding: str = None, errors: str = None,
+                 level: int = None, flush_interval: float = 1.0):
+        self.path = path
+        self.archive_type = archive_type
+        self.encoding = encoding or "utf-8"
+        self.errors = errors or "strict"
+        self.flush_interval = flush_interval
+        self._last_flush = time.monotonic()
+        self._dirty = False
+        if archive_type == "zst":
+            self._file = open(path, "ab")
+            self._writer = zstandard.ZstdCompressor(level=level or 3).stream_writer(self._file)
+        else:
+            self._file = None
+            self._writer = gzip.GzipFile(path, mode="ab", compresslevel=level or 6)
+
+    @property
+    def closed(self) -> bool:
+        return self._writer is None
+
+    @property
+    def dirty(self) -> bool:
+        """Есть записанное, но еще не сброшенное на диск"""
+        return self._dirty
+
+    def write(self, s: str):
+        self._writer.write(s.encode(self.encoding, self.errors))
+        self._dirty = True
+
+    def flush(self, force: bool = False):
+        if self._writer is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_flush < self.flush_interval:
+            return
+        self._last_flush = now
+        self._dirty = False
+        if self.archive_type == "zst":
+            self._writer.flush(zstandard.FLUSH_BLOCK)
+        else:
+            self._writer.flush()
+
+    def close(self):
+        # завершаем фрейм: после этого файл - полноценный архив
+        if self._writer is None:
+            return
+        writer, self._writer = self._writer, None
+        writer.close()
+        if self._file is not None:
+            self._file.close()
+
+
+def find_uncompressed_rotations(base_filename: str, suffix: str) -> list[str]:
+    """
+    Файлы ротации base_filename, которые остались несжатыми (например, процесс упал до сжатия)
+
+    Заодно удаляет недописанные архивы.
+    """
+    r = []
+    prefix = base_filename + "."
+    for file in glob.glob(glob.escape(base_filename) + ".*"):
+        rest = file[len(prefix):]
+        if PARTIAL_MARK in rest:
+            try:
+                os.remove(file)
+            except OSError:
+                pass
+            continue
+        try:
+            time.strptime(rest, suffix)
+        except ValueError:
+            continue
+        r.append(file)
+    r.sort()
+    return r
+
+
+class BackupRetention:
+    """
+    Индекс файлов ротации одного логгера и их удаление по количеству, объему и возрасту
+
+    Индекс строится один раз сканированием файлов <base_filename>.<suffix>[.<архив>],
+    дальше пополняется при ротациях. Удаляются самые старые: prune стоит O(k),
+    где k - число удаленных файлов.
+
+    Args:
+        max_count: сколько файлов хранить (0 - без ограничения)
+        max_bytes: суммарный объем файлов
+        max_age: возраст в секундах, считая от времени ротации
+
+    Файлы, которые не удалось удалить, выпадают из индекса и учитываются в errors/last_error.
+    """
+
+    def __init__(self, base_filename: str, suffix: str, max_count: int = 0, max_bytes: int = 0,
+                 max_age: float = 0, utc: bool = False):
+        self.base_filename = base_filename
+        self.suffix = suffix
+        self.max_count = max_count
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.utc = utc
+        self.total_bytes = 0
+        self.removed = 0
+        self.errors = 0
+        self.last_error = None
+        self._lock = threading.Lock()
+        # файл ротации без расширения архива -> (время ротации, фактический путь, размер)
+        self._index: OrderedDict[str, tuple[float, str, int]] = OrderedDict()
+        self._build()
+
+    def __len__(self):
+        return len(self._index)
+
+    def _build(self):
+        prefix = self.base_filename + "."
+        found = []
+        for file in glob.glob(glob.escape(self.base_filename) + ".*"):
+            rest = file[len(prefix):]
+            if PARTIAL_MARK in rest:
+                continue
+            stem, ext = os.path.splitext(rest)
+            if ext[1:] in ARCHIVE_TYPES:
+                rest = stem
+            stamp = self._parse_stamp(rest)
+            if stamp is None:
+                continue
+            try:
+                size = os.path.getsize(file)
+            except OSError:
+                continue
+            found.append((stamp, prefix + rest, file, size))
+        found.sort()
+        for stamp, rotated, file, size in found:
+            prev = self._index.get(rotated)
+            if prev:
+                # и несжатый файл, и архив (сбой между сжатием и удалением) - учитываем оба
+                size += prev[2]
+            self._index[rotated] = (stamp, file, size)
+            self.total_bytes += size - (prev[2] if prev else 0)
+
+    def _parse_stamp(self, s: str):
+        try:
+            t = time.strptime(s, self.suffix)
+        except ValueError:
+            return None
+        return calendar.timegm(t) if self.utc else time.mktime(t)
+
+    def add(self, rotated: str, path: str = None):
+        """Учесть файл ротации rotated (path - во что он превратился после сжатия)"""
+        path = path or rotated
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        stamp = self._parse_stamp(rotated[len(self.base_filename) + 1:])
+        if stamp is None:
+            stamp = time.time()
+        with self._lock:
+            prev = self._index.pop(rotated, None)
+            if prev:
+                self.total_bytes -= prev[2]
+            newest = next(reversed(self._index.values()))[0] if self._index else None
+            self._index[rotated] = (stamp, path, size)
+            self.total_bytes += size
+            if newest is not None and stamp < newest:
+                # обычно ротации приходят по порядку, иначе восстанавливаем его
+                self._index = OrderedDict(sorted(self._index.items(), key=lambda kv: kv[1][0]))
+
+    def prune(self, now: float = None) -> list[str]:
+        """Удалить самые старые файлы сверх лимитов; возвращает удаленные пути"""
+        now = time.time() if now is None else now
+        removed = []
+        failed = []
+        with self._lock:
+            while self._index:
+                rotated, (stamp, path, size) = next(iter(self._index.items()))
+                if not ((0 < self.max_count < len(self._index))
+                        or (0 < self.max_bytes < self.total_bytes)
+                        or (0 < self.max_age < now - stamp)):
+                    break
+                self._index.popitem(last=False)
+                self.total_bytes -= size
+                for file in {path, rotated}:
+                    try:
+                        os.remove(file)
+                        removed.append(file)
+                    except FileNotFoundError:
+                        pass
+                    except OSError as e:
+                        failed.append((file, e))
+        self.removed += len(removed)
+        if failed:
+            self.errors += len(failed)
+            self.last_error = str(failed[-1][1])
+            # вне блокировки: запись в лог может сама вызвать ротацию
+            for file, e in failed:
+                logger.warning("log retention: can't remove %s: %s", file, e)
+        return removed
+
+
+class RolloverWorker:
+    """
+    Поток, выполняющий сжатие и удаление файлов ротации вне потока логирования
+
+    Задачи выполняются по одной в порядке поступления; ошибка задачи печатается и не
+    останавливает поток. Отложенные задачи (submit_later) выполняются не раньше своего срока
+    и не учитываются в pending/wait.
+    """
+
+    def __init__(self, name="log-rollover"):
+        self.name = name
+        self._jobs = deque()
+        # (срок, номер, задача) - куча отложенных задач
+        self._delayed = []
+        self._seq = 0
+        self._cond = threading.Condition(threading.Lock())
+        self._running = 0
+        self._thread = None
+        self.done = 0
+        self.failed = 0
+        self.last_error = None
+
+    @property
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._jobs) + self._running
+
+    def submit(self, job: Callable[[], None]):
+        with self._cond:
+            self._jobs.append(job)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def submit_later(self, job: Callable[[], None], delay: float):
+        """Выполнить job не раньше чем через delay секунд"""
+        with self._cond:
+            self._seq += 1
+            heapq.heappush(self._delayed, (time.monotonic() + delay, self._seq, job))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def wait(self, timeout: float = None) -> bool:
+        """Дождаться выполнения всех поставленных задач; False - не успели за timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._jobs or self._running:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    while self._delayed and self._delayed[0][0] <= now:
+                        self._jobs.append(heapq.heappop(self._delayed)[2])
+                    if self._jobs:
+                        break
+                    self._cond.wait(self._delayed[0][0] - now if self._delayed else None)
+                job = self._jobs.popleft()
+                self._running = 1
+            try:
+                job()
+                self.done += 1
+            except BaseException as e:
+                self.failed += 1
+                self.last_error = str(e)
+                traceback.print_exc()
+            finally:
+                with self._cond:
+                    self._running = 0
+                    self._cond.notify_all()
+
+
+rollover_worker = RolloverWorker()
+
+
+def wait_for_rollovers(timeout: float = None) -> bool:
+    """Дождаться отложенных сжатий логов (например, перед остановкой приложения)"""
+    return rollover_worker.wait(timeout)
@@ -1,38 +1,54 @@
 import codecs
 import functools
-import glob
 import logging
 import logging.handlers
 import os
+import random
 import threading
 import time
 import traceback
 import uuid
-import zipfile
-from collections import deque, defaultdict
+import weakref
+from collections import defaultdict
 from dataclasses import dataclass, field
 from datetime import datetime
 from logging import Logger
-from pathlib import Path
 from typing import Protocol
 
 import requests
 
 from pythonjsonlogger import jsonlogger
 from requests import Session
+from requests.adapters import HTTPAdapter
+from urllib3 import Retry
+from urllib3.exceptions import EmptyPoolError
 from src.mybootstrap_ioc_itskovichanton import ioc
 from src.mybootstrap_ioc_itskovichanton.config import ConfigService
 from src.mybootstrap_ioc_itskovichanton.ioc import bean
 
 from src.mybootstrap_core_itskovichanton import alerts
 from src.mybootstrap_core_itskovichanton.alerts import Alert
+from src.mybootstrap_core_itskovichanton.log_rotation import RolloverWorker, rollover_worker, compress_file, \
+    find_uncompressed_rotations, CompressedLogStream, STREAMING_ARCHIVE_TYPES, archive_path, \
+    resolve_streaming_archive_type, BackupRetention
+from src.mybootstrap_core_itskovichanton.availability import availability_prober, AvailabilitySnapshot, ProbeRecord
+from src.mybootstrap_core_itskovichanton.stats.latency_histogram import LatencyHistogram
+from src.mybootstrap_core_itskovichanton.log_queue import QueueLogHandler, LogQueueStats, OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST
 from src.mybootstrap_core_itskovichanton.utils import trim_string, to_dict_deep, unescape_str, singleton, generate_uid, \
-    UrlCheckResult, check_url_availability_with_socket, check_url_availability_by_url, is_listable
+    UrlCheckResult, check_url_availability_with_socket, is_listable, WordsMatcher
 
 
 @dataclass
 class RequestStats:
-    times: deque = field(default_factory=lambda: deque(maxlen=200))
+    """
+    Статистика запросов по одному маршруту
+
+    Складывается (merge) со статистикой других сессий и процессов: между процессами
+    передается через to_dict/from_dict. last_time - время последнего успешного соединения (unix-время).
+    """
+
+    latency: LatencyHistogram = field(default_factory=LatencyHistogram)
+    latency_by_status: dict[str, LatencyHistogram] = field(default_factory=lambda: defaultdict(LatencyHistogram))
     connection_success_count: int = 0
     last_time: float = None
     connection_fail_count: int = 0
@@ -42,18 +58,51 @@ class RequestStats:
     last_err_response: str = None
     response_statuses: dict[str, int] = field(default_factory=lambda: defaultdict(int))
     last_err: str = None
+    streamed_count: int = 0
+    bytes_received: int = 0
+    transfer_latency: LatencyHistogram = field(default_factory=LatencyHistogram)
 
     @property
     def avg_time(self):
-        return sum(self.times) / len(self.times) if self.times else 0.0
+        return self.latency.avg
 
     @property
     def max_time(self):
-        return max(self.times) if self.times else 0.0
+        return self.latency.max or 0.0
+
+    def record_time(self, elapsed: float, status: str = None):
+        self.latency.record(elapsed)
+        if status is not None:
+            self.latency_by_status[status].record(elapsed)
+
+    def merge(self, other: "RequestStats") -> "RequestStats":
+        """Добавить к себе статистику other (другой сессии или процесса); возвращает self"""
+        self.latency.merge(other.latency)
+        for status, h in other.latency_by_status.items():
+            self.latency_by_status[status].merge(h)
+        self.transfer_latency.merge(other.transfer_latency)
+        for status, n in other.response_statuses.items():
+            self.response_statuses[status] += n
+        self.connection_success_count += other.connection_success_count
+        self.connection_fail_count += other.connection_fail_count
+        self.err_response_count += other.err_response_count
+        self.streamed_count += other.streamed_count
+        self.bytes_received += other.bytes_received
+        self.connection_problem_actual = self.connection_problem_actual or other.connection_problem_actual
+        self.err_response_problem_actual = self.err_response_problem_actual or other.err_response_problem_actual
+        if other.last_time is not None and (self.last_time is None or other.last_time > self.last_time):
+            self.last_time = other.last_time
+            self.last_err_response = other.last_err_response or self.last_err_response
+            self.last_err = other.last_err or self.last_err
+        else:
+            self.last_err_response = self.last_err_response or other.last_err_response
+            self.last_err = self.last_err or other.last_err
+        return self
 
     def summary(self):
+        latency = self.latency.summary()
         return {
-            "ago_sec": (time.perf_counter() - self.last_time) if self.last_time else None,
+            "ago_sec": (time.time() - self.last_time) if self.last_time else None,
             "connection_problem_actual": self.connection_problem_actual,
             "err_response_problem_actual": self.err_response_problem_actual,
             "last_err_response": self.last_err_response,
@@ -62,14 +111,65 @@ class RequestStats:
             "connection_fail_count": self.connection_fail_count,
             "response_statuses": self.response_statuses,
             "last_err": self.last_err,
-            "avg_time": self.avg_time,
-            "max_time": self.max_time,
+            "avg_time": latency.avg,
+            "max_time": latency.max,
+            "p50_time": latency.p50,
+            "p95_time": latency.p95,
+            "p99_time": latency.p99,
+            "time_by_status": {status: h.summary() for status, h in self.latency_by_status.items()},
+            "streamed_count": self.streamed_count,
+            "bytes_received": self.bytes_received,
+            "avg_transfer_time": self.transfer_latency.avg,
+            "p95_transfer_time": self.transfer_latency.percentile(95),
         }
 
+    def to_dict(self) -> dict:
+        """Полное состояние в виде, пригодном для JSON и from_dict (например, для передачи в другой процесс)"""
+        return {
+            "latency": self.latency.to_dict(),
+            "latency_by_status": {status: h.to_dict() for status, h in self.latency_by_status.items()},
+            "connection_success_count": self.connection_success_count,
+            "last_time": self.last_time,
+            "connection_fail_count": self.connection_fail_count,
+            "err_response_count": self.err_response_count,
+            "connection_problem_actual": self.connection_problem_actual,
+            "err_response_problem_actual": self.err_response_problem_actual,
+            "last_err_response": self.last_err_response,
+            "response_statuses": dict(self.response_statuses),
+            "last_err": self.last_err,
+            "streamed_count": self.streamed_count,
+            "bytes_received": self.bytes_received,
+            "transfer_latency": self.transfer_latency.to_dict(),
+        }
+
+    @staticmethod
+    def from_dict(d: dict) -> "RequestStats":
+        r = RequestStats(**{k: v for k, v in d.items()
+                            if k not in ("latency", "latency_by_status", "response_statuses", "transfer_latency")})
+        r.latency = LatencyHistogram.from_dict(d["latency"])
+        for status, h in d["latency_by_status"].items():
+            r.latency_by_status[status] = LatencyHistogram.from_dict(h)
+        r.response_statuses.update(d["response_statuses"])
+        r.transfer_latency = LatencyHistogram.from_dict(d["transfer_latency"])
+        return r
+
+
+def merge_request_stats(*stats: dict[str, RequestStats | dict]) -> dict[str, RequestStats]:
+    """
+    Сложить статистику по маршрутам из нескольких сессий или процессов
+
+    Статистика другого процесса передается в виде RequestStats.to_dict().
+    """
+    r = defaultdict(RequestStats)
+    for d in stats:
+        for route, st in d.items():
+            r[route].merge(st if isinstance(st, RequestStats) else RequestStats.from_dict(st))
+    return dict(r)
+
 
 class LoggerService(Protocol):
 
-    def get_session_stats(self):
+    def get_session_stats(self, merged: bool = False):
         ...
 
     def get_simple_file_logger(self, name) -> Logger:
@@ -79,19 +179,30 @@ class LoggerService(Protocol):
         ...
 
     def get_logged_session(self, logger_name="outgoing-requests", url=None, route=None,
-                           error_words_detectors=None) -> Session:
+                           error_words_detectors=None, capture=None, pool: "PoolConfig" = None) -> Session:
         ...
 
     def get_file_logger(self, name: str, encoding: str = "utf-8",
-                        formatter=None, max_line_len: int = 3000) -> Logger:
+                        formatter=None, max_line_len: int = 3000, queued: bool = None,
+                        overflow: str = None) -> Logger:
+        ...
+
+    def get_async_logged_session(self, logger_name="outgoing-requests", url=None, route=None,
+                                 error_words_detectors=None, capture=None, limits=None):
+        ...
+
+    def get_log_queue_stats(self) -> dict[str, LogQueueStats]:
         ...
 
 
 class SimpleJsonFormatter(jsonlogger.JsonFormatter):
 
-    def __init__(self, *args, trim_values_len=3000, **kwargs):
+    def __init__(self, *args, trim_values_len=3000, max_depth=32, max_items=500, max_bytes=256 * 1024, **kwargs):
         super().__init__(*args, **kwargs)
         self.trim_values_len = trim_values_len
+        self.max_depth = max_depth
+        self.max_items = max_items
+        self.max_bytes = max_bytes
 
     def add_fields(self, log_record, record, message_dict):
         super(SimpleJsonFormatter, self).add_fields(log_record, record, message_dict)
@@ -104,7 +215,8 @@ class SimpleJsonFormatter(jsonlogger.JsonFormatter):
         if self.trim_values_len > 0:
             trimmed_e = to_dict_deep(log_record,
                                      value_mapper=lambda _, v: trim_string(v, limit=self.trim_values_len)
-                                     if type(v) == str else v)
+                                     if type(v) == str else v,
+                                     max_depth=self.max_depth, max_items=self.max_items, max_bytes=self.max_bytes)
             log_record.clear()
             log_record.update(trimmed_e)
 
@@ -129,13 +241,70 @@ class LogCompressor(Protocol):
 
 
 class TimedCompressedRotatingFileHandler(logging.handlers.TimedRotatingFileHandler):
+    """
+    Ротация по времени со сжатием
+
+    Сжатие и удаление старых файлов выполняет rollover_worker, поток логирования ждет
+    только переименования файла. Несжатые после сбоя файлы ротации досжимаются при старте.
+
+    При archive_type "gz" или "zst" (если установлен zstandard) лог сразу пишется сжатым
+    потоком в <filename>.<archive_type>, и при ротации остается только завершить фрейм.
+    Записанное сбрасывается на диск не позже чем через compress_flush_interval секунд,
+    даже если дальше лог молчит: при сбое теряется не больше этого интервала.
+
+    Старые файлы удаляет BackupRetention: backup_count, backup_max_bytes, backup_max_age (сек).
+    """
 
     def __init__(self, filename, when='midnight', interval=1, backup_count=0, encoding=None, delay=False, utc=False,
-                 at_time=None, errors=None, log_compressor: LogCompressor = None, name=None, archive_type="rar"):
+                 at_time=None, errors=None, log_compressor: LogCompressor = None, name=None, archive_type="rar",
+                 worker: RolloverWorker = None, compress_flush_interval: float = 1.0, backup_max_bytes: int = 0,
+                 backup_max_age: float = 0):
+        # нужны уже в _open, который вызывается из конструктора базового класса
+        if archive_type in STREAMING_ARCHIVE_TYPES:
+            archive_type = resolve_streaming_archive_type(archive_type)
+        self.archive_type = archive_type
+        self.streaming = archive_type in STREAMING_ARCHIVE_TYPES
+        self.compress_flush_interval = compress_flush_interval
+        self._flush_scheduled = False
+        # время начала текущего периода берется из mtime живого файла - до того, как _open его тронет
+        live_mtime = None
+        if self.streaming:
+            try:
+                live_mtime = int(os.stat(archive_path(os.path.abspath(filename), archive_type)).st_mtime)
+            except OSError:
+                pass
         super().__init__(filename, when, interval, backup_count, encoding, delay, utc, at_time, errors)
+        if live_mtime is not None:
+            self.rolloverAt = self.computeRollover(live_mtime)
         self.log_compressor = log_compressor
         self.name = name
-        self.archive_type = archive_type
+        self.worker = worker or rollover_worker
+        self.retention = BackupRetention(self.baseFilename, self.suffix, max_count=self.backupCount,
+                                         max_bytes=backup_max_bytes, max_age=backup_max_age, utc=self.utc)
+        for dfn in find_uncompressed_rotations(self.baseFilename, self.suffix):
+            self.worker.submit(functools.partial(self._compress_and_prune, dfn))
+
+    def _open(self):
+        if self.streaming:
+            return CompressedLogStream(archive_path(self.baseFilename, self.archive_type), self.archive_type,
+                                       encoding=self.encoding, errors=self.errors,
+                                       flush_interval=self.compress_flush_interval)
+        return super()._open()
+
+    def flush(self):
+        super().flush()
+        if self.streaming and not self._flush_scheduled and isinstance(self.stream, CompressedLogStream) \
+                and self.stream.dirty:
+            self._flush_scheduled = True
+            self.worker.submit_later(self._timed_flush, self.compress_flush_interval)
+
+    def _timed_flush(self):
+        # хвост, записанный перед затишьем, иначе лежал бы в памяти до следующей записи
+        with self.lock:
+            self._flush_scheduled = False
+            stream = self.stream
+            if isinstance(stream, CompressedLogStream) and stream.dirty:
+                stream.flush(force=True)
 
     def doRollover(self):
 
@@ -146,19 +315,12 @@ class TimedCompressedRotatingFileHandler(logging.handlers.TimedRotatingFileHandl
         t = self.rolloverAt - self.interval
         time_tuple = time.localtime(t)
         dfn = self.baseFilename + "." + time.strftime(self.suffix, time_tuple)
+        if self.streaming:
+            self._rollover_stream(dfn)
+            return
         if os.path.exists(dfn):
             os.remove(dfn)
         os.rename(self.baseFilename, dfn)
-        if self.backupCount > 0:
-            # find the oldest log file and delete it
-            # s = glob.glob(self.baseFilename + ".20*")
-            s = glob.glob(f"{Path(self.baseFilename).parent.absolute()}/*.{datetime.now().year}*")
-            if len(s) > self.backupCount:
-                s.sort()
-                os.remove(s[0])
-        # print "%s -> %s" % (self.baseFilename, dfn)
-        # if self.log_compressor:
-        #     dfn = self.log_compressor.compress(log_type=self.name, file=dfn)
         if self.encoding:
             self.stream = codecs.open(self.baseFilename, 'w', self.encoding)
         else:
@@ -166,22 +328,37 @@ class TimedCompressedRotatingFileHandler(logging.handlers.TimedRotatingFileHandl
 
         self.rolloverAt += self.interval
 
-        if self.archive_type == "rar":
-            if os.path.exists(dfn + ".rar"):
-                os.remove(dfn + ".rar")
-            import patoolib
-            patoolib.create_archive(dfn + ".rar", [dfn], program='rar', verbosity=-1)
+        # if self.log_compressor:
+        #     dfn = self.log_compressor.compress(log_type=self.name, file=dfn)
+        self.worker.submit(functools.partial(self._compress_and_prune, dfn))
+
+    def _rollover_stream(self, dfn):
+        # фрейм уже завершен закрытием потока - файл остается только переименовать
+        live = archive_path(self.baseFilename, self.archive_type)
+        if os.path.exists(live):
+            os.replace(live, archive_path(dfn, self.archive_type))
+        self.stream = self._open()
+        self.rolloverAt += self.interval
+        self.worker.submit(functools.partial(self._compress_and_prune, dfn))
+
+    def _compress_and_prune(self, dfn):
+        if os.path.exists(dfn):
+            self.retention.add(dfn, compress_file(dfn, self.archive_type))
         else:
-            if os.path.exists(dfn + ".zip"):
-                os.remove(dfn + ".zip")
-            file = zipfile.ZipFile(dfn + ".zip", "w")
-            file.write(dfn, os.path.basename(dfn), zipfile.ZIP_DEFLATED)
-            file.close()
+            self.retention.add(dfn, archive_path(dfn, self.archive_type))
+        self.retention.prune()
 
-        os.remove(dfn)
+    def wait_for_rollovers(self, timeout: float = None) -> bool:
+        return self.worker.wait(timeout)
 
+    def close(self):
+        # не теряем начатые сжатия при остановке
+        self.worker.wait(30)
+        super().close()
 
-def _adapt_body(body, content_type):
+
+def _adapt_body(body, content_type, max_bytes: int = 10000, total: int = None):
+    # total - полный размер, если body - лишь начало тела
     if body is None:
         return None
 
@@ -193,47 +370,360 @@ def _adapt_body(body, content_type):
                 break
 
     if not readable and isinstance(body, bytes):
-        return f"binary[{len(body)}]"
+        return f"binary[{total or len(body)}]"
+
+    # обрезаем до преобразования в строку, чтобы не копировать большое тело целиком
+    if isinstance(body, (bytes, str)):
+        size = total or len(body)
+        if (max_bytes is not None and size > max_bytes) or size > len(body):
+            return str(body[:max_bytes]) + f"...(truncated, total={size})"
 
     text = str(body)
     tl = len(text)
-    if tl > 10000:
-        return text[:10000] + f"...(truncated, total={tl})"
+    if max_bytes is not None and tl > max_bytes:
+        return text[:max_bytes] + f"...(truncated, total={tl})"
     return text
 
 
+BODIES_ALWAYS = "always"
+BODIES_NEVER = "never"
+BODIES_ON_PROBLEM = "on_problem"
+
+
+@dataclass(frozen=True)
+class CapturePolicy:
+    """
+    Что писать в лог о запросах маршрута (статистика считается по всем запросам)
+
+    Неизменяемый и хэшируемый: участвует в ключе кэша get_logged_session.
+
+    Args:
+        sample_rate: доля логируемых запросов
+        always_log_problems: ошибки и медленные запросы логировать независимо от sample_rate
+        headers: писать заголовки
+        bodies: "always", "never" или "on_problem" - только для ошибок и медленных запросов
+        slow_threshold: с какой длительности (сек) запрос считается медленным
+        max_body_bytes: сколько байт тела брать в лог
+    """
+    sample_rate: float = 1.0
+    always_log_problems: bool = True
+    headers: bool = True
+    bodies: str = BODIES_ALWAYS
+    slow_threshold: float = None
+    max_body_bytes: int = 10000
+
+    def is_slow(self, elapsed: float) -> bool:
+        return self.slow_threshold is not None and elapsed >= self.slow_threshold
+
+    def should_log(self, problem: bool) -> bool:
+        if problem and self.always_log_problems:
+            return True
+        return self.sample_rate >= 1 or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    def capture_bodies(self, problem: bool) -> bool:
+        return self.bodies == BODIES_ALWAYS or (problem and self.bodies == BODIES_ON_PROBLEM)
+
+
+DEFAULT_CAPTURE_POLICY = CapturePolicy()
+
+
+@dataclass(frozen=True)
+class PoolConfig:
+    """
+    Пул соединений сессии (HTTPAdapter)
+
+    Неизменяемый и хэшируемый: участвует в ключе кэша get_logged_session.
+
+    Args:
+        pool_connections: сколько хостов держать в пуле
+        pool_maxsize: соединений на хост
+        pool_block: при исчерпании пула ждать свободное соединение (не дольше pool_timeout),
+            а не открывать лишнее
+        max_retries: повторы при ошибках соединения и статусах retry_statuses
+        backoff_factor: пауза между повторами (как в urllib3.Retry)
+    """
+    pool_connections: int = 10
+    pool_maxsize: int = 10
+    pool_block: bool = False
+    pool_timeout: float = None
+    max_retries: int = 0
+    backoff_factor: float = 0
+    retry_statuses: tuple = ()
+
+    def __post_init__(self):
+        # список статусов из настроек или от вызывающего сделал бы конфиг нехэшируемым
+        object.__setattr__(self, "retry_statuses", tuple(self.retry_statuses or ()))
+
+    def retry(self):
+        if not self.max_retries:
+            return 0
+        return Retry(total=self.max_retries, backoff_factor=self.backoff_factor,
+                     status_forcelist=self.retry_statuses or None, raise_on_status=False)
+
+
+@dataclass
+class PoolStats:
+    checkouts: int = 0
+    new_connections: int = 0
+    reused_connections: int = 0
+    wait_time: float = 0.0
+    max_wait_time: float = 0.0
+    timeouts: int = 0
+
+    @property
+    def reuse_ratio(self) -> float:
+        return self.reused_connections / self.checkouts if self.checkouts else 0.0
+
+    @property
+    def avg_wait_time(self) -> float:
+        return self.wait_time / self.checkouts if self.checkouts else 0.0
+
+    def summary(self):
+        return {
+            "checkouts": self.checkouts,
+            "new_connections": self.new_connections,
+            "reused_connections": self.reused_connections,
+            "reuse_ratio": self.reuse_ratio,
+            "avg_wait_time": self.avg_wait_time,
+            "max_wait_time": self.max_wait_time,
+            "timeouts": self.timeouts,
+        }
+
+
+def _stats_pool_class(base, stats: PoolStats, lock: threading.Lock, pool_timeout: float = None):
+    # пул urllib3, считающий выдачи соединений: новые/переиспользованные и ожидание свободного
+
+    def _get_conn(self, timeout=None):
+        if timeout is None:
+            # requests не передает pool_timeout в urlopen
+            timeout = pool_timeout
+        start = time.perf_counter()
+        try:
+            conn = base._get_conn(self, timeout)
+        except EmptyPoolError:
+            with lock:
+                stats.timeouts += 1
+            raise
+        waited = time.perf_counter() - start
+        # у соединения, которое еще не подключалось (или было сброшено), сокета нет
+        reused = getattr(conn, "sock", None) is not None
+        with lock:
+            stats.checkouts += 1
+            if reused:
+                stats.reused_connections += 1
+            else:
+                stats.new_connections += 1
+            stats.wait_time += waited
+            if waited > stats.max_wait_time:
+                stats.max_wait_time = waited
+        return conn
+
+    return type(base.__name__, (base,), {"_get_conn": _get_conn})
+
+
+class StatsHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter с настройками PoolConfig и статистикой пула (PoolStats)"""
+
+    __attrs__ = HTTPAdapter.__attrs__ + ["pool_config", "pool_stats"]
+
+    def __init__(self, config: PoolConfig = None):
+        self.pool_config = config or PoolConfig()
+        self.pool_stats = PoolStats()
+        self._pool_stats_lock = threading.Lock()
+        super().__init__(pool_connections=self.pool_config.pool_connections, pool_maxsize=self.pool_config.pool_maxsize,
+                         max_retries=self.pool_config.retry(), pool_block=self.pool_config.pool_block)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            scheme: _stats_pool_class(cls, self.pool_stats, self._pool_stats_lock, self.pool_config.pool_timeout)
+            for scheme, cls in self.poolmanager.pool_classes_by_scheme.items()
+        }
+
+    def __setstate__(self, state):
+        self._pool_stats_lock = threading.Lock()
+        super().__setstate__(state)
+
+
 @dataclass
 class SessionStats:
-    stats: dict[str, RequestStats] = None
+    # маршрут -> RequestStats.summary()
+    stats: dict[str, dict] = None
     availability: UrlCheckResult = None
+    availability_age_sec: float = None
+    availability_history: list[ProbeRecord] = None
+    pool: PoolStats = None
 
+    def set_availability(self, snapshot: AvailabilitySnapshot):
+        self.availability = snapshot.result
+        self.availability_age_sec = snapshot.age_sec
+        self.availability_history = snapshot.history
 
-@singleton(ttl=5 * 60)
-def _check_url_availability(url, session=None):
-    return check_url_availability_by_url(url, session=session)
 
+class ExchangeRecorder:
+    """
+    Статистика и лог исходящих запросов, общие для SessionWithStats и AsyncSessionWithStats
 
-class SessionWithStats(requests.Session):
+    Args:
+        route: маршрут для статистики - строка или функция url без query -> маршрут
+            (по умолчанию - сам url без query)
+        error_words_detectors: подстроки тела ответа, означающие ошибку; ищутся в сыром теле
+            за один проход, не дальше error_words_scan_limit байт
+        capture: CapturePolicy для всех маршрутов, dict маршрут -> CapturePolicy
+            (ключ None - для остальных) или функция маршрут -> CapturePolicy
+    """
 
-    def __init__(self, name, logger=None, url=None, route=None, error_words_detectors=None):
-        super().__init__()
+    error_words_scan_limit = 16 * 1024
+
+    def _init_recorder(self, name, logger=None, url=None, route=None, error_words_detectors=None, capture=None):
         self.name = name
         self._stats = defaultdict(RequestStats)
         self._lock = threading.Lock()
         if error_words_detectors and not is_listable(error_words_detectors):
             error_words_detectors = [error_words_detectors]
         self._error_words_detectors = error_words_detectors
+        self._error_words_matcher = WordsMatcher(error_words_detectors) if error_words_detectors else None
         self._logger = logger or logging.getLogger(name)
         self._url = url
         self._route = route
+        self._capture = capture
+        if url:
+            # доступность проверяется в фоне, stats отдает последний результат
+            availability_prober.register(url, self)
+
+    def _close_recorder(self):
+        if self._url:
+            availability_prober.unregister(self._url, self)
+
+    def stats_snapshot(self) -> dict[str, RequestStats]:
+        """Копия статистики по маршрутам, снятая под блокировкой сессии"""
+        with self._lock:
+            return {route: RequestStats().merge(st) for route, st in self._stats.items()}
+
+    def stats_summary(self) -> dict[str, dict]:
+        """Сводка статистики по маршрутам (RequestStats.summary())"""
+        return {route: st.summary() for route, st in self.stats_snapshot().items()}
+
+    def capture_policy(self, route) -> CapturePolicy:
+        capture = self._capture
+        if capture is None:
+            return DEFAULT_CAPTURE_POLICY
+        if isinstance(capture, CapturePolicy):
+            return capture
+        if isinstance(capture, dict):
+            return capture.get(route) or capture.get(None) or DEFAULT_CAPTURE_POLICY
+        return capture(route) or DEFAULT_CAPTURE_POLICY
+
+    def route_of(self, url: str):
+        if self._route:
+            if callable(self._route):
+                return self._route(url.split("?")[0])
+            return self._route
+        return url.split("?")[0]
+
+    def _complete(self, route, x: "Exchange"):
+        err_words_found = self._update_stats(route, x, read_body=True)
+        self._log_exchange(route, x, err_words_found)
+
+    def _update_stats(self, route, x: "Exchange", read_body: bool) -> bool:
+        response = x.response
+        err_words_found = False
+        with self._lock:
+            st = self._stats[route]
+            if x.streamed:
+                # заголовки учтены при получении ответа
+                st.streamed_count += 1
+                st.bytes_received += x.stream_bytes
+                st.transfer_latency.record(x.transfer_time)
+            else:
+                st.record_time(x.elapsed, str(response.status_code) if response is not None else None)
+            if x.exc is None:
+                # содеинение успешно, разбираем ответ
+                if not x.streamed:
+                    st.connection_problem_actual = False
+                    st.connection_success_count += 1
+                    st.last_time = time.time()
+                if self._error_words_matcher and (read_body or x.streamed):
+                    err_words_found = self._error_words_matcher.search(
+                        x.raw_body(), self.error_words_scan_limit) is not None
+                    st.err_response_problem_actual = err_words_found
+                    if st.err_response_problem_actual:
+                        st.err_response_count += 1
+                        st.last_err_response = str(x.resp_body())
+            elif not x.streamed:
+                # содеинение упало
+                st.connection_problem_actual = True
+                st.connection_fail_count += 1
+                st.last_err = str(x.exc)
+            if response is not None and not x.streamed:
+                st.response_statuses[str(response.status_code)] += 1
+        return err_words_found
+
+    def _log_exchange(self, route, x: "Exchange", err_words_found: bool):
+        policy = self.capture_policy(route)
+        response = x.response
+        has_response = response is not None
+        problem = (x.exc is not None or err_words_found or (has_response and response.status_code >= 400)
+                   or policy.is_slow(x.elapsed + (x.transfer_time or 0)))
+        if not policy.should_log(problem):
+            return
+
+        headers = policy.headers
+        bodies = policy.capture_bodies(problem)
+        req_headers = x.req_headers
+        extra = {
+            "req": {
+                "method": x.method,
+                "url": x.url,
+                "headers": dict(req_headers) if headers and req_headers else None,
+                "body": _adapt_body(x.req_body, req_headers.get("content-type") if req_headers else None,
+                                    policy.max_body_bytes) if bodies else None,
+            },
+            "res": {
+                "code": response.status_code if has_response else None,
+                "reason": response.reason if has_response else None,
+                "url": response.url if has_response else None,
+                "headers": dict(response.headers) if headers and has_response and response.headers else None,
+                "body": x.resp_body(policy.max_body_bytes) if bodies and has_response else None,
+            },
+            "err": str(x.exc) if x.exc else None,
+            "elapsed": x.elapsed,
+        }
+        if x.streamed:
+            extra["res"]["bytes"] = x.stream_bytes
+            extra["ttfb"] = x.ttfb
+            extra["transfer_time"] = x.transfer_time
+
+        self._logger.info(extra)
+
+
+class SessionWithStats(ExchangeRecorder, requests.Session):
+    """
+    requests.Session со статистикой и логом запросов (см. ExchangeRecorder)
+
+    Args:
+        pool: настройки пула соединений и повторов
+    """
+
+    def __init__(self, name, logger=None, url=None, route=None, error_words_detectors=None, capture=None,
+                 pool: PoolConfig = None):
+        super().__init__()
+        self._adapter = StatsHTTPAdapter(pool)
+        self.mount("http://", self._adapter)
+        self.mount("https://", self._adapter)
+        self._init_recorder(name, logger, url, route, error_words_detectors, capture)
 
     @property
     def stats(self) -> SessionStats:
-        r = SessionStats(stats=self._stats)
+        r = SessionStats(stats=self.stats_summary(), pool=self._adapter.pool_stats)
         if self._url:
-            r.availability = _check_url_availability(self._url, session=self)
+            r.set_availability(availability_prober.snapshot(self._url))
         return r
 
+    def close(self):
+        super().close()
+        self._close_recorder()
+
     def request(self, method, url, *args, **kwargs):
 
         start = time.perf_counter()
@@ -251,6 +741,10 @@ class SessionWithStats(requests.Session):
             req_headers["User-Agent"] = self.name
         req_headers["X-Request-ID"] = generate_uid()
 
+        stream = kwargs.get("stream")
+        if stream is None:
+            stream = self.stream
+
         try:
             response = super().request(method, url, *args, **kwargs)
             return response
@@ -259,60 +753,154 @@ class SessionWithStats(requests.Session):
             raise
         finally:
             elapsed = time.perf_counter() - start
-            if self._route:
-                if callable(self._route):
-                    route = self._route(url.split("?")[0])
-                else:
-                    route = self._route
+            route = self.route_of(url)
+
+            exchange = Exchange(method, url, req_headers, req_body, response, exc, start, elapsed)
+            if stream and response is not None:
+                # тело еще не прочитано: статистику и лог дополним, когда вызывающий его дочитает
+                self._update_stats(route, exchange, read_body=False)
+                _StreamCapture(self, route, exchange)
             else:
-                route = url.split("?")[0]
-
-            resp_body = _adapt_body(response.content if response else None,
-                                    response.headers.get("content-type")
-                                    if response and response.headers else None)
-
-            # Обновляем статистику
-            with self._lock:
-                st = self._stats[route]
-                st.times.append(elapsed)
-                if exc is None:
-                    # содеинение успешно, разбираем ответ
-                    st.connection_problem_actual = False
-                    st.connection_success_count += 1
-                    st.last_time = time.perf_counter()
-                    if self._error_words_detectors:
-                        st.err_response_problem_actual = any(w in resp_body for w in self._error_words_detectors or [])
-                        if st.err_response_problem_actual:
-                            st.err_response_count += 1
-                            st.last_err_response = str(resp_body)
-                else:
-                    # содеинение упало
-                    st.connection_problem_actual = True
-                    st.connection_fail_count += 1
-                    st.last_err = str(exc)
-                if response:
-                    st.response_statuses[str(response.status_code)] += 1
-
-            # Логирование
-            extra = {
-                "req": {
-                    "method": method,
-                    "url": url,
-                    "headers": dict(req_headers) if req_headers else None,
-                    "body": _adapt_body(req_body, req_headers.get("content-type") if req_headers else None),
-                },
-                "res": {
-                    "code": response.status_code if response else None,
-                    "reason": response.reason if response else None,
-                    "url": response.url if response else None,
-                    "headers": dict(response.headers) if response and response.headers else None,
-                    "body": resp_body,
-                },
-                "err": str(exc) if exc else None,
-                "elapsed": elapsed,
-            }
-
-            self._logger.info(extra)
+                self._complete(route, exchange)
+
+
+class Exchange:
+    """Запрос и ответ одного вызова для статистики и лога ExchangeRecorder"""
+
+    def __init__(self, method, url, req_headers, req_body, response, exc, start, elapsed):
+        self.method = method
+        self.url = url
+        self.req_headers = req_headers
+        self.req_body = req_body
+        self.response = response
+        self.exc = exc
+        self.start = start
+        self.elapsed = elapsed
+        self.content_type = response.headers.get("content-type") if response is not None and response.headers \
+            else None
+        self._resp_bodies = {}
+        # для stream=True: сохраненное начало тела, объем, время до первого байта и передачи
+        self.streamed = False
+        self.stream_prefix: bytes = None
+        self.stream_bytes = 0
+        self.ttfb: float = None
+        self.transfer_time: float = None
+
+    def set_streamed(self, prefix: bytes, n_bytes: int, first_byte_at: float, last_byte_at: float):
+        self.streamed = True
+        self.stream_prefix = prefix
+        self.stream_bytes = n_bytes
+        if first_byte_at is not None:
+            self.ttfb = first_byte_at - self.start
+            self.transfer_time = last_byte_at - self.start - self.elapsed
+        else:
+            self.transfer_time = 0.0
+
+    def raw_body(self):
+        if self.response is None:
+            return None
+        return self.stream_prefix if self.streamed else self.response.content
+
+    def resp_body(self, max_bytes: int = 10000):
+        if self.response is None:
+            return None
+        r = self._resp_bodies.get(max_bytes)
+        if r is None:
+            if self.streamed:
+                r = _adapt_body(self.stream_prefix, self.content_type, max_bytes, total=self.stream_bytes)
+            else:
+                r = _adapt_body(self.response.content, self.content_type, max_bytes)
+            r = r or ""
+            self._resp_bodies[max_bytes] = r
+        return r
+
+
+class _StreamCapture:
+    """
+    Учет потокового ответа (stream=True) по мере чтения
+
+    Подменяет iter_content и close у ответа (через них же работают iter_lines и content):
+    считает байты, время до первого байта и передачи, хранит не более max_body_bytes
+    начала тела. Статистика и лог дописываются, когда тело дочитано, ответ закрыт
+    или собран сборщиком мусора. Чтение напрямую из response.raw не учитывается.
+    """
+
+    def __init__(self, session: SessionWithStats, route, exchange: Exchange):
+        self.session = session
+        self.route = route
+        self.x = exchange
+        self.limit = session.capture_policy(route).max_body_bytes or 0
+        self.prefix = bytearray()
+        self.bytes = 0
+        self.first_byte_at = None
+        self.last_byte_at = None
+        self.done = False
+        self._lock = threading.Lock()
+
+        response = exchange.response
+        iter_content = response.iter_content
+        close = response.close
+
+        def counted_iter_content(chunk_size=1, decode_unicode=False):
+            chunks = self.count(iter_content(chunk_size, decode_unicode=False))
+            if decode_unicode:
+                chunks = requests.utils.stream_decode_response_unicode(chunks, response)
+            return chunks
+
+        def counted_close():
+            try:
+                close()
+            finally:
+                self.finish()
+
+        response.iter_content = counted_iter_content
+        response.close = counted_close
+        # ответ не дочитали и не закрыли - допишем при сборке мусора, поэтому ссылок на response не держим
+        self.detached = _DetachedResponse(response)
+        exchange.response = None
+        weakref.finalize(response, self.finish)
+
+    def count(self, chunks):
+        completed = False
+        try:
+            for chunk in chunks:
+                now = time.perf_counter()
+                if self.first_byte_at is None:
+                    self.first_byte_at = now
+                self.last_byte_at = now
+                self.bytes += len(chunk)
+                room = self.limit - len(self.prefix)
+                if room > 0:
+                    self.prefix += chunk[:room]
+                yield chunk
+            completed = True
+        finally:
+            if completed:
+                self.finish()
+
+    def finish(self):
+        with self._lock:
+            if self.done:
+                return
+            self.done = True
+        x = self.x
+        x.response = self.detached
+        x.set_streamed(bytes(self.prefix), self.bytes, self.first_byte_at, self.last_byte_at)
+        self.prefix = None
+        try:
+            err_words_found = self.session._update_stats(self.route, x, read_body=False)
+            self.session._log_exchange(self.route, x, err_words_found)
+        finally:
+            x.response = None
+
+
+class _DetachedResponse:
+    # то, что нужно для лога от ответа, который к тому времени может быть уже собран
+    def __init__(self, response):
+        self.status_code = response.status_code
+        self.reason = response.reason
+        self.url = response.url
+        self.headers = response.headers
 
 
 @bean
@@ -321,9 +909,17 @@ class LoggerServiceImpl(LoggerService):
     log_compressor: LogCompressor = None
 
     def init(self, **kwargs):
-        self._sessions: dict[str, SessionWithStats] = defaultdict(SessionWithStats)
-
-    def get_session_stats(self):
+        self._sessions: dict[str, ExchangeRecorder] = defaultdict(SessionWithStats)
+        self._log_queues: dict[str, QueueLogHandler] = {}
+
+    def get_session_stats(self, merged: bool = False):
+        """
+        Args:
+            merged: вместо статистики по сессиям - сводка по маршрутам, сложенная по всем сессиям
+        """
+        if merged:
+            stats = merge_request_stats(*(session.stats_snapshot() for session in self._sessions.values()))
+            return {route: st.summary() for route, st in stats.items()}
         return {name: stats.stats for name, stats in self._sessions.items()}
 
     def get_simple_file_logger(self, name) -> Logger:
@@ -366,15 +962,83 @@ class LoggerServiceImpl(LoggerService):
 
     @singleton
     def get_logged_session(self, logger_name="outgoing-requests", url=None, route=None,
-                           error_words_detectors=None) -> Session:
+                           error_words_detectors=None, capture=None, pool: PoolConfig = None) -> Session:
+        """
+        Args:
+            pool: настройки пула; по умолчанию - из loggers.<logger_name>.pool_maxsize, pool_block и т.д.
+        """
         logger = self.get_file_logger(logger_name)
+        if pool is None:
+            pool = self._pool_config(logger_name)
         r = SessionWithStats(f"{self.config_service.app_name()}:{logger_name}", logger, url, route,
-                             error_words_detectors)
+                             error_words_detectors, capture, pool)
         self._sessions[logger_name] = r
         return r
 
+    @singleton
+    def get_async_logged_session(self, logger_name="outgoing-requests", url=None, route=None,
+                                 error_words_detectors=None, capture=None, limits=None):
+        """
+        Асинхронный аналог get_logged_session (AsyncSessionWithStats, нужен httpx)
+
+        Args:
+            limits: httpx.Limits пула соединений
+        """
+        from src.mybootstrap_core_itskovichanton.async_logged_session import AsyncSessionWithStats
+
+        logger = self._async_file_logger(logger_name)
+        r = AsyncSessionWithStats(f"{self.config_service.app_name()}:{logger_name}", logger, url, route,
+                                  error_words_detectors, capture, limits)
+        self._sessions[f"{logger_name}:async"] = r
+        return r
+
+    def _async_file_logger(self, logger_name) -> Logger:
+        """
+        Логгер для асинхронных сессий: пишет в тот же файл, что и get_file_logger(logger_name),
+        но через свою очередь - запись идет в потоке-писателе, а не в цикле событий, и при
+        переполнении старые записи вытесняются, а не блокируют цикл. Синхронный логгер
+        остается таким, как настроен
+        """
+        base = self.get_file_logger(logger_name)
+        if logger_name in self._log_queues:
+            # логгер и так пишет через очередь (loggers.<name>.queue) - используем его
+            return base
+        name = f"{logger_name}:async"
+        r = logging.getLogger(name)
+        if not hasattr(r, "inited"):
+            r.setLevel(base.level)
+            r.propagate = False
+            # обработчики общие с base: их блокировка упорядочивает запись из обоих логгеров
+            r.addHandler(self._queue_handler(logger_name, list(base.handlers), OVERFLOW_DROP_OLDEST, name=name))
+            r.inited = True
+        return r
+
+    def _pool_config(self, logger_name) -> PoolConfig:
+        prefix = "loggers." + logger_name
+        props = ioc.context.properties
+        default = PoolConfig()
+        return PoolConfig(
+            pool_connections=props.get(prefix + ".pool_connections", default.pool_connections),
+            pool_maxsize=props.get(prefix + ".pool_maxsize", default.pool_maxsize),
+            pool_block=props.get(prefix + ".pool_block", default.pool_block),
+            pool_timeout=props.get(prefix + ".pool_timeout", default.pool_timeout),
+            max_retries=props.get(prefix + ".max_retries", default.max_retries),
+            backoff_factor=props.get(prefix + ".retry_backoff_factor", default.backoff_factor),
+            retry_statuses=props.get(prefix + ".retry_statuses", default.retry_statuses))
+
+    def get_log_queue_stats(self) -> dict[str, LogQueueStats]:
+        return {name: h.stats for name, h in self._log_queues.items()}
+
     def get_file_logger(self, name: str, encoding: str = "utf-8",
-                        formatter=None, max_line_len: int = 3000) -> Logger:
+                        formatter=None, max_line_len: int = 3000, queued: bool = None,
+                        overflow: str = None) -> Logger:
+        """
+        Args:
+            queued: писать через очередь и отдельный поток-писатель (QueueLogHandler);
+                по умолчанию - из настройки loggers.<name>.queue. Действует только при создании
+                логгера: уже созданный логгер не меняется
+            overflow: политика переполнения очереди, если она не задана в loggers.<name>.overflow
+        """
         r = logging.getLogger(name)
         if hasattr(r, "inited"):
             return r
@@ -390,18 +1054,39 @@ class LoggerServiceImpl(LoggerService):
             encoding=encoding,
             filename=f"{os.path.join(self.config_service.dir('logs'), name)}-{self.config_service.app_name()}.txt",
             when=props.get(logger_settings_prefix + ".when", "midnight"),
-            backup_count=props.get(logger_settings_prefix + ".backup_count", 365))
+            backup_count=props.get(logger_settings_prefix + ".backup_count", 365),
+            backup_max_bytes=props.get(logger_settings_prefix + ".backup_max_bytes", 0),
+            backup_max_age=props.get(logger_settings_prefix + ".backup_max_age", 0))
 
         if not formatter:
             formatter = SimpleJsonFormatter("%(t)s %(msg)s", trim_values_len=max_line_len)
         log_handler.setFormatter(formatter)
 
+        if queued is None:
+            queued = props.get(logger_settings_prefix + ".queue", False)
+        if queued:
+            log_handler = self._queue_handler(name, log_handler, overflow)
+
         r.addHandler(log_handler)
 
         r.inited = True
 
         return r
 
+    def _queue_handler(self, logger_name, handlers, overflow: str = None, name: str = None) -> QueueLogHandler:
+        # name - под каким именем очередь видна в get_log_queue_stats (по умолчанию - имя логгера)
+        logger_settings_prefix = "loggers." + logger_name
+        props = ioc.context.properties
+        name = name or logger_name
+        r = QueueLogHandler(
+            handlers,
+            name=name,
+            capacity=props.get(logger_settings_prefix + ".queue_size", 10000),
+            overflow=props.get(logger_settings_prefix + ".overflow", overflow or OVERFLOW_BLOCK),
+            batch_size=props.get(logger_settings_prefix + ".batch_size", 256))
+        self._log_queues[name] = r
+        return r
+
 
 def lg(logger, desc=None, action=None, alert=False):
     s = ": ".join([action, desc])
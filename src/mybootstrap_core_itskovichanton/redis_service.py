@@ -10,6 +10,8 @@ from src.mybootstrap_ioc_itskovichanton.config import ConfigService
 from src.mybootstrap_ioc_itskovichanton.ioc import bean
 from src.mybootstrap_mvc_itskovichanton.exceptions import CoreException
 
+from src.mybootstrap_core_itskovichanton.cache import RedisCacheTier
+
 
 @dataclass
 class RedisConfig:
@@ -38,6 +40,9 @@ class RedisService:
     def get(self) -> Redis:
         return Redis(host=self.config.host, port=self.config.port, db=0, password=self.config.password)
 
+    def make_cache_tier(self, namespace: str = "singleton", serializer=pickle) -> RedisCacheTier:
+        return RedisCacheTier(self.get, prefix=f"{self.config_service.app_name()}:{namespace}", serializer=serializer)
+
     def make_map(self, value_class: type, hname: str, key_prefix=None, deserializer=default_deserializer,
                  pre_serializer=lambda x: x):
 
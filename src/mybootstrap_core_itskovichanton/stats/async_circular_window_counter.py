@@ -2,12 +2,11 @@ import asyncio
 from datetime import timedelta
 import time
 from typing import List
-import array
 
-from src.mybootstrap_core_itskovichanton.stats.sync_circular_window_counter import CircularWindowCounter
+from src.mybootstrap_core_itskovichanton.stats.sync_circular_window_counter import CircularWindowCounter, WindowRing
 
 
-class AsyncCircularWindowCounter:
+class AsyncCircularWindowCounter(WindowRing):
     """
     Асинхронная версия оконного счетчика
 
@@ -29,7 +28,7 @@ class AsyncCircularWindowCounter:
         self.resolution = resolution
 
         self.buffer_size = int(self.window_seconds / resolution) + 1
-        self._buffer = array.array('L', [0]) * self.buffer_size
+        self._buffer = self._new_buffer()
         self._index = 0
         self._total = 0
 
@@ -45,25 +44,6 @@ class AsyncCircularWindowCounter:
         if auto_cleanup:
             self._cleanup_task = asyncio.create_task(self._auto_cleanup())
 
-    def _update_index(self, now: float) -> int:
-        """Синхронное обновление индекса (вызывается под блокировкой)"""
-        delta = now - self._last_update
-        steps = int(delta / self.resolution)
-
-        if steps <= 0:
-            return self._index
-
-        max_steps = min(steps, self.buffer_size)
-
-        for _ in range(max_steps):
-            self._index = (self._index + 1) % self.buffer_size
-            self._total -= self._buffer[self._index]
-            self._buffer[self._index] = 0
-
-        self._last_update = now + (steps - max_steps) * self.resolution
-
-        return self._index
-
     async def add(self, count: int = 1) -> None:
         """Асинхронно добавить значение"""
         now = time.monotonic()
@@ -115,7 +95,7 @@ class AsyncCircularWindowCounter:
     async def reset(self) -> None:
         """Асинхронно сбросить счетчик"""
         async with self._lock:
-            self._buffer = array.array('L', [0]) * self.buffer_size
+            self._buffer = self._new_buffer()
             self._index = 0
             self._total = 0
             self._last_update = time.monotonic()
@@ -151,6 +131,65 @@ class AsyncCircularWindowCounter:
         return f"<AsyncCircularWindowCounter buffer={self.buffer_size}>"
 
 
+class LockFreeAsyncCircularWindowCounter(AsyncCircularWindowCounter):
+    """
+    Асинхронный оконный счетчик без asyncio.Lock и без фоновой задачи
+
+    Методы не содержат await, поэтому в одном потоке цикла событий выполняются
+    атомарно и блокировка не нужна. Устаревшие сегменты очищаются лениво при
+    обращении (за O(1) вызовов, см. WindowRing), так что простаивающий счетчик
+    не тратит CPU. Можно создавать вне работающего цикла событий.
+    Не для использования из нескольких потоков.
+    """
+
+    def __init__(self, window: timedelta, resolution: float = 0.1):
+        super().__init__(window, resolution, auto_cleanup=False)
+
+    def add_nowait(self, count: int = 1) -> None:
+        """Добавить значение (синхронно, из кода цикла событий)"""
+        idx = self._update_index(time.monotonic())
+        self._buffer[idx] += count
+        self._total += count
+        self._cached_speed = 0.0
+
+    def count_nowait(self) -> int:
+        self._update_index(time.monotonic())
+        return self._total
+
+    def speed_nowait(self) -> float:
+        now = time.monotonic()
+        if self._cached_speed > 0 and now - self._last_speed_update < 0.1:
+            return self._cached_speed
+        self._update_index(now)
+        if self.window_seconds <= 0:
+            return 0.0
+        self._cached_speed = self._total / self.window_seconds
+        self._last_speed_update = now
+        return self._cached_speed
+
+    async def add(self, count: int = 1) -> None:
+        self.add_nowait(count)
+
+    async def add_batch(self, counts: List[int]) -> None:
+        self.add_nowait(sum(counts))
+
+    async def speed(self) -> float:
+        return self.speed_nowait()
+
+    async def count(self) -> int:
+        return self.count_nowait()
+
+    async def reset(self) -> None:
+        self._buffer = self._new_buffer()
+        self._index = 0
+        self._total = 0
+        self._last_update = time.monotonic()
+        self._cached_speed = 0.0
+
+    def __repr__(self) -> str:
+        return f"<LockFreeAsyncCircularWindowCounter buffer={self.buffer_size}>"
+
+
 # Адаптер для синхронного использования в асинхронном коде
 class ThreadedWindowCounter:
     """
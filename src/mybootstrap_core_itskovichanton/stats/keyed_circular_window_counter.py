@@ -0,0 +1,207 @@
+import threading
+import time
+from datetime import timedelta
+from typing import Hashable
+
+import numpy as np
+
+from src.mybootstrap_core_itskovichanton.stats.sync_circular_window_counter import WindowRing
+
+
+class KeyedCircularWindowCounter(WindowRing):
+    """
+    Семейство оконных счетчиков по ключам (маршрут, клиент, очередь) в одном 2-D массиве ключи x сегменты
+
+    Кольцо общее: сдвиг времени очищает столбец сегментов сразу у всех ключей, а на ключ
+    приходится только строка сегментов. Массив растет по мере появления ключей, но не больше
+    max_keys строк: при заполнении место освобождается за счет ключей с пустым окном, затем
+    ключа, обновлявшегося раньше всех.
+
+    Пример:
+        counter = KeyedCircularWindowCounter(timedelta(minutes=1))
+        counter.add("/api/orders")
+        counter.top_k(10)  # [(ключ, скорость), ...] по убыванию скорости
+
+    Args:
+        max_keys: предел числа ключей
+        idle_timeout: через сколько секунд без add() ключ удаляется в evict_idle()
+    """
+
+    def __init__(self, window: timedelta, resolution: float = 0.1, max_keys: int = 10000,
+                 idle_timeout: float = None, initial_capacity: int = 64):
+        self.window_seconds = window.total_seconds()
+        self.resolution = resolution
+        self.buffer_size = int(self.window_seconds / resolution) + 1
+        self.max_keys = max_keys
+        self.idle_timeout = idle_timeout
+        self.evicted = 0
+
+        self._capacity = max(1, min(initial_capacity, max_keys))
+        self._buffer = self._new_buffer()
+        self._total = np.zeros(self._capacity, dtype=np.uint64)
+        self._last_seen = np.zeros(self._capacity, dtype=np.float64)
+        self._index = 0
+        self._last_update = time.monotonic()
+
+        self._rows: dict[Hashable, int] = {}
+        self._keys: list = [None] * self._capacity
+        self._free = list(range(self._capacity - 1, -1, -1))
+        self._lock = threading.Lock()
+
+    def _new_buffer(self):
+        return np.zeros((self._capacity, self.buffer_size), dtype=np.uint64)
+
+    def _clear_slots(self, start: int, end: int):
+        cleared = self._buffer[:, start:end].sum(axis=1, dtype=np.uint64)
+        self._buffer[:, start:end] = 0
+        return cleared
+
+    def _clear_all(self):
+        self._buffer.fill(0)
+        self._total.fill(0)
+
+    def _grow(self):
+        capacity = min(self.max_keys, self._capacity * 2)
+        buffer = np.zeros((capacity, self.buffer_size), dtype=np.uint64)
+        buffer[:self._capacity] = self._buffer
+        self._buffer = buffer
+        self._total = np.concatenate((self._total, np.zeros(capacity - self._capacity, dtype=np.uint64)))
+        self._last_seen = np.concatenate((self._last_seen, np.zeros(capacity - self._capacity)))
+        self._keys.extend([None] * (capacity - self._capacity))
+        self._free.extend(range(capacity - 1, self._capacity - 1, -1))
+        self._capacity = capacity
+
+    def _row(self, key, now: float) -> int:
+        row = self._rows.get(key)
+        if row is not None:
+            return row
+        if not self._free:
+            if self._capacity < self.max_keys:
+                self._grow()
+            else:
+                self._evict_for(now)
+        row = self._free.pop()
+        self._rows[key] = row
+        self._keys[row] = key
+        return row
+
+    def _evict_for(self, now: float):
+        # место под новый ключ: сначала ключи с пустым окном, иначе самый давно обновлявшийся
+        self._update_index(now)
+        used = np.fromiter(self._rows.values(), dtype=np.int64, count=len(self._rows))
+        empty = used[self._total[used] == 0]
+        if empty.size:
+            for row in empty.tolist():
+                self._remove_row(row)
+        else:
+            self._remove_row(int(used[np.argmin(self._last_seen[used])]))
+
+    def _remove_row(self, row: int):
+        del self._rows[self._keys[row]]
+        self._keys[row] = None
+        self._buffer[row] = 0
+        self._total[row] = 0
+        self._last_seen[row] = 0
+        self._free.append(row)
+        self.evicted += 1
+
+    def add(self, key, count: int = 1) -> None:
+        now = time.monotonic()
+
+        with self._lock:
+            idx = self._update_index(now)
+            row = self._row(key, now)
+            self._buffer[row, idx] += count
+            self._total[row] += count
+            self._last_seen[row] = now
+
+    def count(self, key) -> int:
+        with self._lock:
+            self._update_index(time.monotonic())
+            row = self._rows.get(key)
+            return int(self._total[row]) if row is not None else 0
+
+    def speed(self, key) -> float:
+        if self.window_seconds <= 0:
+            return 0.0
+        return self.count(key) / self.window_seconds
+
+    def speeds(self) -> dict:
+        """Скорости всех ключей"""
+        with self._lock:
+            self._update_index(time.monotonic())
+            window = self.window_seconds or 1
+            return {key: int(self._total[row]) / window for key, row in self._rows.items()}
+
+    def top_k(self, n: int) -> list[tuple]:
+        """n ключей с наибольшей скоростью: [(ключ, скорость), ...] по убыванию"""
+        with self._lock:
+            self._update_index(time.monotonic())
+            if not self._rows or n <= 0:
+                return []
+            used = np.fromiter(self._rows.values(), dtype=np.int64, count=len(self._rows))
+            totals = self._total[used]
+            if n < used.size:
+                top = np.argpartition(totals, used.size - n)[used.size - n:]
+            else:
+                top = np.arange(used.size)
+            top = top[np.argsort(totals[top], kind="stable")[::-1]]
+            window = self.window_seconds or 1
+            return [(self._keys[used[i]], int(totals[i]) / window) for i in top.tolist()]
+
+    def evict_idle(self, max_idle: float = None) -> list:
+        """
+        Удалить ключи без add() дольше max_idle секунд (по умолчанию idle_timeout),
+        а без него - ключи с пустым окном
+
+        Returns:
+            list: удаленные ключи
+        """
+        max_idle = self.idle_timeout if max_idle is None else max_idle
+        now = time.monotonic()
+        with self._lock:
+            self._update_index(now)
+            if not self._rows:
+                return []
+            used = np.fromiter(self._rows.values(), dtype=np.int64, count=len(self._rows))
+            if max_idle is None:
+                idle = used[self._total[used] == 0]
+            else:
+                idle = used[now - self._last_seen[used] > max_idle]
+            r = [self._keys[row] for row in idle.tolist()]
+            for row in idle.tolist():
+                self._remove_row(row)
+            return r
+
+    def remove(self, key) -> bool:
+        with self._lock:
+            row = self._rows.get(key)
+            if row is None:
+                return False
+            self._remove_row(row)
+            self.evicted -= 1
+            return True
+
+    def keys(self) -> list:
+        return list(self._rows)
+
+    def __contains__(self, key) -> bool:
+        return key in self._rows
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get_stats(self) -> dict:
+        return {
+            'keys': len(self._rows),
+            'capacity': self._capacity,
+            'max_keys': self.max_keys,
+            'evicted': self.evicted,
+            'window_seconds': self.window_seconds,
+            'resolution': self.resolution,
+            'buffer_size': self.buffer_size,
+            'memory_bytes': self._buffer.nbytes + self._total.nbytes + self._last_seen.nbytes,
+        }
+
+    def __repr__(self) -> str:
+        return f"<KeyedCircularWindowCounter keys={len(self._rows)} buffer={self.buffer_size}>"
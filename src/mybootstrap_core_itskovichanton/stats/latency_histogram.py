@@ -0,0 +1,150 @@
+import math
+from dataclasses import dataclass
+
+
+@dataclass
+class LatencySummary:
+    count: int
+    avg: float
+    min: float
+    max: float
+    p50: float
+    p90: float
+    p95: float
+    p99: float
+
+
+class LatencyHistogram:
+    """
+    Гистограмма длительностей с лог-линейными корзинами (как в HDR Histogram)
+
+    Каждая степень двойки от min_value до max_value делится на sub_buckets равных корзин,
+    поэтому относительная ошибка перцентиля не больше 1/sub_buckets, а память постоянна.
+    Гистограммы с одинаковыми параметрами складываются (merge) - в том числе полученные
+    из других процессов через to_dict/from_dict. Для отчетов - summary().
+
+    Args:
+        min_value: нижняя граница точного учета (меньшие значения попадают в первую корзину)
+        max_value: верхняя граница (большие значения попадают в последнюю корзину)
+        sub_buckets: корзин на степень двойки
+    """
+
+    __slots__ = ("min_value", "max_value", "sub_buckets", "counts", "count", "total", "min", "max")
+
+    def __init__(self, min_value: float = 1e-5, max_value: float = 3600, sub_buckets: int = 16):
+        self.min_value = min_value
+        self.max_value = max_value
+        self.sub_buckets = sub_buckets
+        octaves = max(1, math.ceil(math.log2(max_value / min_value)))
+        self.counts = [0] * (octaves * sub_buckets + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def _index(self, value: float) -> int:
+        u = value / self.min_value
+        if u < 1:
+            return 0
+        m, e = math.frexp(u)
+        i = 1 + (e - 1) * self.sub_buckets + int((m * 2 - 1) * self.sub_buckets)
+        last = len(self.counts) - 1
+        return i if i < last else last
+
+    def _bucket_bounds(self, i: int) -> tuple[float, float]:
+        if i == 0:
+            return 0.0, self.min_value
+        e, sub = divmod(i - 1, self.sub_buckets)
+        low = self.min_value * (2 ** e) * (1 + sub / self.sub_buckets)
+        high = self.min_value * (2 ** e) * (1 + (sub + 1) / self.sub_buckets)
+        return low, high
+
+    def record(self, value: float, n: int = 1):
+        self.counts[self._index(value)] += n
+        self.count += n
+        self.total += value * n
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    @property
+    def avg(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, p: float) -> float:
+        """Значение p-го перцентиля (0..100) - середина корзины, в пределах [min, max]"""
+        return self.percentiles(p)[0]
+
+    def percentiles(self, *ps: float) -> list[float]:
+        """Несколько перцентилей за один проход по корзинам"""
+        if not self.count:
+            return [0.0] * len(ps)
+        order = sorted(range(len(ps)), key=lambda k: ps[k])
+        r = [self.max] * len(ps)
+        seen = 0
+        j = 0
+        rank = max(1, math.ceil(self.count * ps[order[0]] / 100))
+        for i, c in enumerate(self.counts):
+            if not c:
+                continue
+            seen += c
+            while seen >= rank:
+                low, high = self._bucket_bounds(i)
+                r[order[j]] = min(max((low + high) / 2, self.min), self.max)
+                j += 1
+                if j == len(ps):
+                    return r
+                rank = max(1, math.ceil(self.count * ps[order[j]] / 100))
+        return r
+
+    def compatible(self, other: "LatencyHistogram") -> bool:
+        return (self.min_value, self.max_value, self.sub_buckets) == \
+            (other.min_value, other.max_value, other.sub_buckets)
+
+    def merge(self, other: "LatencyHistogram") -> "LatencyHistogram":
+        """Добавить к себе значения other; возвращает self"""
+        if not self.compatible(other):
+            raise ValueError("can't merge histograms with different bucket layouts")
+        counts = self.counts
+        for i, c in enumerate(other.counts):
+            if c:
+                counts[i] += c
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+        return self
+
+    def copy(self) -> "LatencyHistogram":
+        return LatencyHistogram(self.min_value, self.max_value, self.sub_buckets).merge(self)
+
+    def summary(self) -> LatencySummary:
+        p50, p90, p95, p99 = self.percentiles(50, 90, 95, 99)
+        return LatencySummary(count=self.count, avg=self.avg, min=self.min or 0.0, max=self.max or 0.0,
+                              p50=p50, p90=p90, p95=p95, p99=p99)
+
+    def to_dict(self) -> dict:
+        return {
+            "min_value": self.min_value,
+            "max_value": self.max_value,
+            "sub_buckets": self.sub_buckets,
+            "counts": {i: c for i, c in enumerate(self.counts) if c},
+            "count": self.count,
+            "total": self.total,
+            "min": self.min,
+            "max": self.max,
+        }
+
+    @staticmethod
+    def from_dict(d: dict) -> "LatencyHistogram":
+        r = LatencyHistogram(d["min_value"], d["max_value"], d["sub_buckets"])
+        for i, c in d["counts"].items():
+            r.counts[int(i)] = c
+        r.count = d["count"]
+        r.total = d["total"]
+        r.min = d["min"]
+        r.max = d["max"]
+        return r
@@ -6,7 +6,78 @@ import array
 import numpy as np
 
 
-class CircularWindowCounter:
+_ZERO = array.array('L', [0])
+
+
+class WindowRing:
+    """
+    Кольцевой буфер сегментов окна: сдвиг текущего сегмента по времени с очисткой устаревших
+
+    Наследник задает window_seconds, resolution, buffer_size, _buffer, _index, _total и _last_update.
+    Сдвиг стоит O(1) вызовов независимо от простоя: простой дольше окна сбрасывает буфер
+    целиком, более короткий очищает один-два непрерывных среза.
+    """
+
+    def _new_buffer(self):
+        return array.array('L', [0]) * self.buffer_size
+
+    def _clear_slots(self, start: int, end: int) -> int:
+        """Обнулить сегменты [start, end); возвращает их сумму"""
+        cleared = sum(self._buffer[start:end])
+        self._buffer[start:end] = _ZERO * (end - start)
+        return cleared
+
+    def _clear_all(self):
+        self._buffer = self._new_buffer()
+        self._total = 0
+
+    def _update_index(self, now: float) -> int:
+        """
+        Обновить текущий индекс на основе времени
+
+        Args:
+            now: текущее время (монотонное)
+
+        Returns:
+            int: текущий индекс
+        """
+        steps = int((now - self._last_update) / self.resolution)
+        if steps <= 0:
+            return self._index
+
+        # дробный остаток переносится - границы сегментов не "плывут" от неровных вызовов
+        self._last_update += steps * self.resolution
+        size = self.buffer_size
+        if steps >= size:
+            self._clear_all()
+        else:
+            start = self._index + 1
+            end = start + steps
+            if end <= size:
+                self._total -= self._clear_slots(start, end)
+            else:
+                self._total -= self._clear_slots(start, size) + self._clear_slots(0, end - size)
+        self._index = (self._index + steps) % size
+        return self._index
+
+    def _total_at(self, now: float) -> int:
+        """Сумма окна на момент now без изменения буфера (для чтения из чужого потока)"""
+        steps = int((now - self._last_update) / self.resolution)
+        if steps <= 0:
+            return self._total
+        size = self.buffer_size
+        if steps >= size:
+            return 0
+        buffer = self._buffer
+        start = self._index + 1
+        end = start + steps
+        expired = sum(buffer[start:min(end, size)])
+        if end > size:
+            expired += sum(buffer[:end - size])
+        return max(0, self._total - int(expired))
+
+
+class CircularWindowCounter(WindowRing):
     """
     Высокопроизводительный оконный счетчик с кольцевым буфером
     
@@ -37,7 +108,7 @@ class CircularWindowCounter:
         self.buffer_size = int(self.window_seconds / resolution) + 1
 
         # Кольцевой буфер - используем массив целых чисел
-        self._buffer = array.array('L', [0]) * self.buffer_size  # 'L' для unsigned long
+        self._buffer = self._new_buffer()  # 'L' для unsigned long
         self._index = 0
         self._total = 0
 
@@ -52,34 +123,6 @@ class CircularWindowCounter:
         self._cached_speed = 0.0
         self._last_speed_update = 0.0
 
-    def _update_index(self, now: float) -> int:
-        """
-        Обновить текущий индекс на основе времени
-        
-        Args:
-            now: текущее время (монотонное)
-            
-        Returns:
-            int: текущий индекс
-        """
-        delta = now - self._last_update
-        steps = int(delta / self.resolution)
-
-        if steps <= 0:
-            return self._index
-
-        # Оптимизация: если много шагов, обновляем буфер
-        max_steps = min(steps, self.buffer_size)
-
-        for _ in range(max_steps):
-            self._index = (self._index + 1) % self.buffer_size
-            self._total -= self._buffer[self._index]
-            self._buffer[self._index] = 0
-
-        self._last_update = now + (steps - max_steps) * self.resolution
-
-        return self._index
-
     def add(self, count: int = 1) -> None:
         """
         Добавить значение к счетчику
@@ -122,6 +165,29 @@ class CircularWindowCounter:
         """
         self.add(count * times)
 
+    def add_at(self, timestamps, counts=None) -> None:
+        """
+        Добавить события, произошедшие в заданные моменты
+
+        Args:
+            timestamps: моменты событий по time.monotonic(); вышедшие из окна отбрасываются,
+                        будущие попадают в текущий сегмент
+            counts: значения событий (по умолчанию по 1)
+        """
+        now = time.monotonic()
+
+        with self._lock:
+            idx = self._update_index(now)
+            size = self.buffer_size
+            for i, ts in enumerate(timestamps):
+                k = min(0, int((ts - self._last_update) // self.resolution))
+                if k <= -size:
+                    continue
+                c = 1 if counts is None else counts[i]
+                self._buffer[(idx + k) % size] += c
+                self._total += c
+            self._cached_speed = 0.0
+
     def speed(self) -> float:
         """
         Получить скорость накопления за оконный интервал
@@ -162,7 +228,7 @@ class CircularWindowCounter:
     def reset(self) -> None:
         """Сбросить счетчик"""
         with self._lock:
-            self._buffer = array.array('L', [0]) * self.buffer_size
+            self._buffer = self._new_buffer()
             self._index = 0
             self._total = 0
             self._last_update = time.monotonic()
@@ -192,32 +258,168 @@ class CircularWindowCounter:
         return f"<CircularWindowCounter speed={self.speed():.2f}/s count={self.count()}>"
 
 
-# Супер-быстрая версия с numpy (если доступен)
-class NumpyCircularWindowCounter(CircularWindowCounter):
-    """Версия с numpy для максимальной производительности"""
+class _Shard(WindowRing):
+    # кольцо одного потока: пишет только владелец, читают все
 
-    def __init__(self, window: timedelta, resolution: float = 0.1):
-        super().__init__(window, resolution)
-        self._buffer = np.zeros(self.buffer_size, dtype=np.uint64)
+    def __init__(self, window_seconds: float, resolution: float, buffer_size: int):
+        self.window_seconds = window_seconds
+        self.resolution = resolution
+        self.buffer_size = buffer_size
+        self._buffer = self._new_buffer()
         self._index = 0
         self._total = 0
+        self._last_update = time.monotonic()
+        self.thread = threading.current_thread()
 
-    def _update_index(self, now: float) -> int:
-        delta = now - self._last_update
-        steps = int(delta / self.resolution)
 
-        if steps <= 0:
-            return self._index
+class ShardedCircularWindowCounter:
+    """
+    Оконный счетчик для записи из многих потоков: у каждого потока свое кольцо без блокировок
 
-        steps = min(steps, self.buffer_size)
+    add() пишет только в кольцо текущего потока; speed() и count() суммируют кольца всех
+    потоков. Чтение не останавливает запись, поэтому сумма может отставать на
+    одновременно добавляемые значения. Память - buffer_size сегментов на каждый поток;
+    кольца завершившихся потоков удаляются, когда их значения выходят из окна.
 
-        # Используем numpy для быстрого обновления
-        if steps > 0:
-            indices = [(self._index + i + 1) % self.buffer_size for i in range(steps)]
-            self._total -= np.sum(self._buffer[indices])
-            self._buffer[indices] = 0
-            self._index = indices[-1] if indices else self._index
+    Пример:
+        counter = ShardedCircularWindowCounter(timedelta(seconds=10))
+        counter.add()  # из любого потока
+        speed = counter.speed()
+    """
 
-        self._last_update = now
+    def __init__(self, window: timedelta, resolution: float = 0.1):
+        self.window_seconds = window.total_seconds()
+        self.resolution = resolution
+        self.buffer_size = int(self.window_seconds / resolution) + 1
 
-        return self._index
+        self._local = threading.local()
+        self._shards: list[_Shard] = []
+        # только для регистрации потоков и чтения
+        self._lock = threading.Lock()
+
+        self._cached_speed = 0.0
+        self._last_speed_update = 0.0
+
+    def _shard(self) -> _Shard:
+        shard = _Shard(self.window_seconds, self.resolution, self.buffer_size)
+        with self._lock:
+            self._shards.append(shard)
+        self._local.shard = shard
+        return shard
+
+    def add(self, count: int = 1) -> None:
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._shard()
+        idx = shard._update_index(time.monotonic())
+        shard._buffer[idx] += count
+        shard._total += count
+
+    def add_batch(self, counts: List[int]) -> None:
+        self.add(sum(counts))
+
+    def add_many(self, count: int, times: int) -> None:
+        self.add(count * times)
+
+    def count(self) -> int:
+        now = time.monotonic()
+        total = 0
+        with self._lock:
+            alive = []
+            for shard in self._shards:
+                n = shard._total_at(now)
+                if n or shard.thread.is_alive():
+                    alive.append(shard)
+                total += n
+            self._shards = alive
+        return total
+
+    def speed(self) -> float:
+        now = time.monotonic()
+        if self._cached_speed > 0 and now - self._last_speed_update < 0.1:
+            return self._cached_speed
+        if self.window_seconds <= 0:
+            return 0.0
+        self._cached_speed = self.count() / self.window_seconds
+        self._last_speed_update = now
+        return self._cached_speed
+
+    def reset(self) -> None:
+        """Сбросить счетчик (значения, добавляемые в этот момент, могут потеряться)"""
+        with self._lock:
+            self._local = threading.local()
+            self._shards = []
+            self._cached_speed = 0.0
+
+    @property
+    def shards(self) -> int:
+        return len(self._shards)
+
+    def get_stats(self) -> dict:
+        return {
+            'count': self.count(),
+            'speed': self.speed(),
+            'window_seconds': self.window_seconds,
+            'resolution': self.resolution,
+            'buffer_size': self.buffer_size,
+            'shards': self.shards,
+            'memory_bytes': self.buffer_size * 8 * self.shards,  # приблизительно
+        }
+
+    def __repr__(self) -> str:
+        return f"<ShardedCircularWindowCounter speed={self.speed():.2f}/s count={self.count()} shards={self.shards}>"
+
+
+# Супер-быстрая версия с numpy (если доступен)
+class NumpyCircularWindowCounter(CircularWindowCounter):
+    """
+    Версия с numpy для массовых операций
+
+    Очистка сегментов и add_at векторизованы: add_at раскладывает целый массив событий
+    по сегментам через np.bincount. Одиночный add() не быстрее, чем у базовой версии.
+    """
+
+    def _new_buffer(self):
+        return np.zeros(self.buffer_size, dtype=np.uint64)
+
+    def _clear_slots(self, start: int, end: int) -> int:
+        cleared = int(self._buffer[start:end].sum())
+        self._buffer[start:end] = 0
+        return cleared
+
+    def _clear_all(self):
+        self._buffer.fill(0)
+        self._total = 0
+
+    def add_at(self, timestamps, counts=None) -> None:
+        ts = np.asarray(timestamps, dtype=np.float64)
+        if not ts.size:
+            return
+        now = time.monotonic()
+
+        with self._lock:
+            idx = self._update_index(now)
+            size = self.buffer_size
+            # на сколько сегментов назад от текущего: 0..size-1
+            back = -np.floor((ts - self._last_update) / self.resolution).astype(np.int64)
+            np.maximum(back, 0, out=back)
+            keep = back < size
+            weights = None
+            if counts is not None:
+                weights = np.asarray(counts)
+            if not keep.all():
+                back = back[keep]
+                weights = weights[keep] if weights is not None else None
+                if not back.size:
+                    return
+            binned = np.bincount(back, weights=weights).astype(np.uint64)[::-1]
+            # binned покрывает только сегменты от самого старого события до текущего
+            start = idx - len(binned) + 1
+            if start >= 0:
+                self._buffer[start:idx + 1] += binned
+            else:
+                self._buffer[start + size:] += binned[:-start]
+                self._buffer[:idx + 1] += binned[-start:]
+            self._total += int(binned.sum())
+            self._cached_speed = 0.0
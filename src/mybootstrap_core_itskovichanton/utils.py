@@ -7,10 +7,12 @@ import functools
 import hashlib
 import hmac
 import inspect
+import itertools
 import os
 import random
 import re
 import socket
+import ssl
 import string
 import subprocess
 import sys
@@ -41,6 +43,8 @@ from dateutil.relativedelta import relativedelta
 from requests import Session
 from xsdata.models.datatype import XmlDate, XmlDateTime, XmlTime
 
+from src.mybootstrap_core_itskovichanton.cache import TTLCache, MISSING, SingleFlight, AsyncSingleFlight, \
+    RedisCacheTier
 from src.mybootstrap_core_itskovichanton.structures import CaseInsensitiveDict
 
 
@@ -206,40 +210,98 @@ def md5(a: str):
 def replace_attrs(obj, filter_type,
                   mapper: Callable[[Any, str, Any], Any],
                   collection_mapper: Callable[[Any], Any] = lambda x: x,
-                  is_collection: Callable[[Any], bool] = lambda x: True):
-    if obj is None or isinstance(obj, Enum):
-        return obj
-    # print(type(obj), ": ")
-    if isinstance(obj, filter_type):
-        return mapper(obj, "self", obj)
-    if isinstance(obj, object):
+                  is_collection: Callable[[Any], bool] = lambda x: True,
+                  max_depth: int = None):
+    """
+    Заменяет в графе объектов все значения типа filter_type на mapper(value, "self", value)
+
+    Обход идет по явному стеку: глубина графа не ограничена пределом рекурсии.
+    Объекты, уже обходимые выше по пути (циклы), и объекты глубже max_depth не обходятся.
+    """
+    # кадр: [объект, итератор атрибутов/элементов, результат списка или None, атрибут в родителе]
+    def start(x, depth):
+        if x is None or isinstance(x, Enum):
+            return x, None
+        if isinstance(x, filter_type):
+            return mapper(x, "self", x), None
+        if id(x) in on_path or (max_depth is not None and depth > max_depth):
+            return x, None
         try:
-            for attr, value in obj.__dict__.copy().items():
-                if value is None or attr.startswith("_"):
-                    continue
-                # print("\t", attr)
-                if isinstance(value, (List, Set, Tuple)) and is_collection(value):
-                    value = [replace_attrs(x, filter_type, mapper, collection_mapper, is_collection) for x in value]
-                    try:
-                        value = collection_mapper(value)
-                    except BaseException as e1:
-                        ...
-                        # print("attr: ", attr, "\terror: ", e1)
-                    setattr(obj, attr, value)
-                else:
+            items = iter(x.__dict__.copy().items())
+        except BaseException:
+            return x, None
+        on_path.add(id(x))
+        return x, [x, items, None, None]
+
+    on_path = set()
+    r, root = start(obj, 0)
+    if root is None:
+        return r
+
+    stack = [root]
+    while stack:
+        f = stack[-1]
+        x, items, collected = f[0], f[1], f[2]
+        child = None
+        try:
+            if collected is not None:
+                for item in items:
+                    v, child = start(item, len(stack))
+                    if child is not None:
+                        break
+                    collected.append(v)
+            else:
+                for attr, value in items:
+                    if value is None or attr.startswith("_"):
+                        continue
+                    if isinstance(value, (List, Set, Tuple)) and is_collection(value):
+                        child = [value, iter(value), [], attr]
+                        break
                     try:
-                        value = replace_attrs(value, filter_type, mapper, collection_mapper, is_collection)
-                        setattr(obj, attr, value)
-                    except BaseException as e1:
-                        # print("attr: ", attr, "\terror: ", e1)
+                        value, child = start(value, len(stack))
+                        if child is not None:
+                            child[3] = attr
+                            break
+                        setattr(x, attr, value)
+                    except BaseException:
                         ...
-            return obj
-        except BaseException as e:
-            # print("out of for\t")
-            # print("error: ", e)
-            return obj
-    else:
-        return obj
+        except BaseException:
+            # как и раньше: ошибка в списке прерывает обход объекта-владельца, он возвращается как есть
+            while stack and stack[-1][2] is not None:
+                on_path.discard(id(stack.pop()[0]))
+            if not stack:
+                return obj
+            child = None
+            f = stack[-1]
+            f[1] = iter(())
+            continue
+
+        if child is not None:
+            stack.append(child)
+            continue
+
+        stack.pop()
+        if collected is None:
+            on_path.discard(id(x))
+            value = x
+        else:
+            value = collected
+            try:
+                value = collection_mapper(value)
+            except BaseException:
+                ...
+        if not stack:
+            return value
+        parent = stack[-1]
+        if parent[2] is not None:
+            parent[2].append(value)
+        else:
+            try:
+                setattr(parent[0], f[3], value)
+            except BaseException:
+                if collected is not None:
+                    # setattr списка в исходной версии не защищен - объект-владелец обрывается
+                    parent[1] = iter(())
 
 
 def list_to_map(obj):
@@ -270,60 +332,526 @@ def encode_json_value(_, obj):
     return obj
 
 
+_STANDARD_VALUE_TYPES = (Enum, str, int, float, date, datetime, Decimal, timedelta, XmlDate, XmlTime, XmlDateTime)
+
+
 def is_standard_value_object(obj):
-    return isinstance(obj,
-                      (Enum, str, int, float, date, datetime, Decimal, timedelta, XmlDate, XmlTime,
-                       XmlDateTime)) or isclass(obj)
+    return isinstance(obj, _STANDARD_VALUE_TYPES) or isclass(obj)
 
 
-def to_dict_deep(obj, route=(),
-                 is_value_object: Callable[[tuple, str], bool] = None,
-                 key_mapper: Callable[[tuple, str], str] = lambda _, x: x,
-                 value_mapper: Callable[[tuple, Any], Any] = lambda _, x: x):
-    if obj is None:
-        return None
-    if isinstance(obj, Enum):
-        return value_mapper(route, obj.value)
-    if (is_value_object and is_value_object(route, obj)) or callable(obj):
-        return value_mapper(route, obj)
-    if not isinstance(obj, dict) and ((not obj) or is_standard_value_object(obj)):
-        return value_mapper(route, obj)
-    if isinstance(obj, (List, Set, Tuple)):
-        return [to_dict_deep(x, route, is_value_object, key_mapper, value_mapper) for x in list(obj)]
-    r = None
-    if isinstance(obj, CaseInsensitiveDict):
-        obj = dict(obj)
+_KIND_VALUE = 0
+_KIND_SEQUENCE = 1
+_KIND_OBJECT = 2
+
+# type -> вид значения для to_dict_deep; callable() и isinstance() по стандартным типам зависят только от типа
+_value_kinds: dict[type, int] = {}
+
+# dataclass -> имена публичных полей (None - тип не подходит для плана)
+_dataclass_plans: dict[type, tuple | None] = {}
+
+
+def _value_kind(t: type) -> int:
+    kind = _value_kinds.get(t)
+    if kind is None:
+        if issubclass(t, (*_STANDARD_VALUE_TYPES, type)) or any("__call__" in c.__dict__ for c in t.__mro__):
+            kind = _KIND_VALUE
+        elif issubclass(t, (List, Set, Tuple)):
+            kind = _KIND_SEQUENCE
+        else:
+            kind = _KIND_OBJECT
+        _value_kinds[t] = kind
+    return kind
+
+
+def _dataclass_plan(t: type):
     try:
-        for attr, value in to_dict(obj).items():
-            if value is None or attr.startswith("_"):
+        return _dataclass_plans[t]
+    except KeyError:
+        pass
+    plan = None
+    # план строится только для "обычных" dataclass: без __slots__, итерации, __call__, __bool__/__len__,
+    # поэтому для них в to_dict_deep можно сразу переходить к обходу полей
+    if dataclasses.is_dataclass(t) and "__slots__" not in t.__dict__ and _value_kind(t) == _KIND_OBJECT \
+            and not issubclass(t, (dict, Enum)) \
+            and not any(hasattr(t, a) for a in ("__iter__", "__bool__", "__len__")):
+        names = tuple(f.name for f in dataclasses.fields(t))
+        plan = (tuple(n for n in names if not n.startswith("_")), len(names))
+    _dataclass_plans[t] = plan
+    return plan
+
+
+def _keep_key(_, x):
+    return x
+
+
+def _keep_value(_, x):
+    return x
+
+
+CYCLE_MARKER = "<cycle>"
+MAX_DEPTH_MARKER = "<max depth>"
+
+
+def _truncated_marker(total=None) -> str:
+    return f"...(truncated, total={total})" if total is not None else "...(truncated)"
+
+
+class _Frame:
+    __slots__ = ("obj", "oid", "route", "depth", "items", "result", "is_list", "check_names", "total", "attr",
+                 "skip_on_error")
+
+    def __init__(self, obj, oid, route, depth, items, is_list, check_names=False, total=None):
+        self.obj = obj
+        # id исходного объекта - для обнаружения циклов
+        self.oid = oid
+        self.route = route
+        self.depth = depth
+        self.items = items
+        self.is_list = is_list
+        self.check_names = check_names
+        # общее число элементов, если часть отброшена по max_items
+        self.total = total
+        self.result = [] if is_list else None
+        # ключ в родительском объекте (None - элемент списка)
+        self.attr = None
+        # ошибку этого узла родитель печатает и пропускает атрибут, а не падает сам
+        self.skip_on_error = False
+
+
+class _DictDeepWalker:
+    """
+    Обход для to_dict_deep на явном стеке
+
+    Повторяет поведение рекурсивной версии (в т.ч. обработку ошибок узлов),
+    но не упирается в предел рекурсии, обрывает циклы и соблюдает бюджеты
+    """
+
+    def __init__(self, is_value_object, key_mapper, value_mapper, max_depth, max_items, max_bytes):
+        self.is_value_object = is_value_object
+        self.key_mapper = key_mapper
+        self.value_mapper = value_mapper
+        self.max_depth = max_depth
+        self.max_items = max_items
+        self.bytes_left = max_bytes
+        self.exhausted = False
+        self.truncation_marked = False
+        self.on_path = set()
+
+    def walk(self, obj, route):
+        root = self.start(obj, route, 0)
+        if type(root) is not _Frame:
+            return root
+
+        is_value_object = self.is_value_object
+        key_mapper = self.key_mapper
+        value_mapper = self.value_mapper
+        map_keys = key_mapper is not _keep_key
+        map_values = value_mapper is not _keep_value
+        count_bytes = self.bytes_left is not None
+        value_kinds = _value_kinds
+        start = self.start
+        on_path = self.on_path
+        plans = _dataclass_plans
+        max_depth = self.max_depth
+        max_items = self.max_items
+        # планы dataclass обходят start(), поэтому бюджеты глубины и количества проверяются здесь
+        fast_plans = not is_value_object
+
+        stack = [root]
+        while stack:
+            f = stack[-1]
+            child = None
+            # дочерние узлы f еще не глубже max_depth
+            child_plans = fast_plans and (max_depth is None or f.depth < max_depth)
+            try:
+                if f.is_list:
+                    for x in f.items:
+                        if count_bytes and self.exhausted:
+                            break
+                        if child_plans and (plan := plans.get(type(x))) is not None \
+                                and id(x) not in on_path and len(x.__dict__) == plan[1] \
+                                and (max_items is None or len(plan[0]) <= max_items):
+                            child = _Frame(x, id(x), f.route, f.depth + 1, zip(plan[0], map(x.__dict__.get, plan[0])),
+                                           False)
+                            on_path.add(child.oid)
+                            break
+                        res = start(x, f.route, f.depth + 1)
+                        if type(res) is _Frame:
+                            child = res
+                            break
+                        f.result.append(res)
+                        if count_bytes:
+                            self.spend(res)
+                else:
+                    route = f.route
+                    check_names = f.check_names
+                    for attr, value in f.items:
+                        if count_bytes and self.exhausted:
+                            break
+                        if value is None or (check_names and attr.startswith("_")):
+                            continue
+                        new_route = (*route, attr) if map_keys else None
+                        if map_keys:
+                            attr = key_mapper(new_route, attr)
+                        kind = value_kinds.get(type(value))
+                        if kind is None:
+                            kind = _value_kind(type(value))
+                        if (is_value_object and is_value_object(route, value)) or kind == _KIND_VALUE:
+                            if map_values:
+                                value = value_mapper(route, value)
+                            if not f.result:
+                                f.result = {}
+                            f.result.setdefault(attr, value)
+                            if count_bytes:
+                                # то же, что spend(), без вызова метода на каждое значение
+                                self.bytes_left -= (len(value) if type(value) is str else 8) + \
+                                                   (len(attr) if type(attr) is str else 8)
+                                if self.bytes_left < 0:
+                                    self.exhausted = True
+                            continue
+                        if new_route is None:
+                            new_route = (*route, attr)
+                        if kind == _KIND_SEQUENCE:
+                            res = self.start_list(value, new_route, f.depth + 1)
+                        elif child_plans and (plan := plans.get(type(value))) is not None \
+                                and id(value) not in on_path and len(value.__dict__) == plan[1] \
+                                and (max_items is None or len(plan[0]) <= max_items):
+                            # вложенный dataclass с готовым планом, укладывающийся в бюджеты
+                            res = _Frame(value, id(value), new_route, f.depth + 1,
+                                         zip(plan[0], map(value.__dict__.get, plan[0])), False)
+                            res.skip_on_error = True
+                            on_path.add(res.oid)
+                        else:
+                            try:
+                                res = start(value, new_route, f.depth + 1)
+                            except BaseException:
+                                # атрибут, который не удалось обойти, пропускается
+                                continue
+                            if type(res) is _Frame:
+                                res.skip_on_error = True
+                        if type(res) is _Frame:
+                            res.attr = attr
+                            child = res
+                            break
+                        if not f.result:
+                            f.result = {}
+                        f.result.setdefault(attr, res)
+                        if count_bytes:
+                            self.spend(res, attr)
+            except BaseException as e:
+                stack.pop()
+                self.on_path.discard(f.oid)
+                resolved, value = self.fail(stack, f, e)
+                if resolved:
+                    return value
                 continue
-            new_route = (*route, attr)
-            attr = key_mapper(new_route, attr)
-            if (is_value_object and is_value_object(route, value)) or callable(value) or is_standard_value_object(
-                    value):
-                value = value_mapper(route, value)
-                if not r:
-                    r = {}
-                r.setdefault(attr, value)
-            elif isinstance(value, (List, Set, Tuple)):
-                value = [to_dict_deep(x, new_route, is_value_object, key_mapper, value_mapper) for x in value]
-                if not r:
-                    r = {}
-                r.setdefault(attr, value)
+
+            if child is not None:
+                stack.append(child)
+                continue
+
+            # узел обойден полностью (или обход остановлен бюджетом)
+            stack.pop()
+            on_path.discard(f.oid)
+            if f.total is not None or (count_bytes and self.exhausted):
+                self.finish(f)
+            if not stack:
+                return f.result
+            parent = stack[-1]
+            if parent.is_list:
+                parent.result.append(f.result)
             else:
+                if not parent.result:
+                    parent.result = {}
+                parent.result.setdefault(f.attr, f.result)
+            if count_bytes:
+                self.spend(None, f.attr)
+
+    def start(self, obj, route, depth):
+        """Вернуть готовое значение для obj или _Frame, если obj нужно обходить"""
+        if obj is None:
+            return None
+        is_value_object = self.is_value_object
+        plan = _dataclass_plans.get(type(obj))
+        if plan is not None and not is_value_object:
+            # для известного dataclass все проверки ниже заведомо ложны
+            return self.start_attrs(obj, obj, plan, route, depth)
+        if isinstance(obj, Enum):
+            return self.value_mapper(route, obj.value)
+        if (is_value_object and is_value_object(route, obj)) or callable(obj):
+            return self.value_mapper(route, obj)
+        kind = _value_kind(type(obj))
+        if not isinstance(obj, dict) and ((not obj) or kind == _KIND_VALUE):
+            return self.value_mapper(route, obj)
+        if kind == _KIND_SEQUENCE:
+            return self.start_list(obj, route, depth)
+        src = obj
+        if isinstance(obj, CaseInsensitiveDict):
+            obj = dict(obj)
+        return self.start_attrs(src, obj, _dataclass_plan(type(obj)), route, depth)
+
+    def start_list(self, obj, route, depth):
+        if id(obj) in self.on_path:
+            return CYCLE_MARKER
+        if self.max_depth is not None and depth > self.max_depth:
+            return MAX_DEPTH_MARKER
+        items = obj
+        total = None
+        if self.max_items is not None and len(obj) > self.max_items:
+            items = itertools.islice(obj, self.max_items)
+            total = len(obj)
+        self.on_path.add(id(obj))
+        return _Frame(obj, id(obj), route, depth, iter(items), True, total=total)
+
+    def start_attrs(self, src, obj, plan, route, depth):
+        if id(src) in self.on_path:
+            return CYCLE_MARKER
+        if self.max_depth is not None and depth > self.max_depth:
+            return MAX_DEPTH_MARKER
+        try:
+            # план не учитывает атрибуты, добавленные экземпляру вне полей dataclass
+            if plan is not None and len(obj.__dict__) == plan[1]:
+                items = zip(plan[0], map(obj.__dict__.get, plan[0]))
+                size = len(plan[0])
+                check_names = False
+            else:
+                d = to_dict(obj)
+                items = d.items()
+                size = len(d)
+                check_names = True
+        except BaseException:
+            return self.value_mapper(route, obj)
+        total = None
+        if self.max_items is not None and size > self.max_items:
+            items = itertools.islice(items, self.max_items)
+            total = size
+        self.on_path.add(id(src))
+        return _Frame(obj, id(src), route, depth, iter(items), False, check_names=check_names, total=total)
+
+    def finish(self, f: _Frame):
+        if f.total is not None:
+            marker = _truncated_marker(f.total)
+        elif self.exhausted and not self.truncation_marked:
+            marker = _truncated_marker()
+        else:
+            return
+        self.truncation_marked = True
+        if f.is_list:
+            f.result.append(marker)
+        else:
+            if not f.result:
+                f.result = {}
+            f.result.setdefault("...", marker)
+
+    def deliver(self, parent: _Frame, attr, value):
+        if parent.is_list:
+            parent.result.append(value)
+        else:
+            if not parent.result:
+                parent.result = {}
+            parent.result.setdefault(attr, value)
+        if self.bytes_left is not None:
+            self.spend(None, attr)
+
+    def fail(self, stack: list, f: _Frame, e: BaseException) -> tuple[bool, Any]:
+        """
+        Ошибка при обходе f: поступаем так же, как рекурсивная версия
+
+        Returns:
+            tuple: (True, значение), если ошибка превратила в значение весь результат
+        """
+        while True:
+            if not f.is_list:
                 try:
-                    value = to_dict_deep(value, new_route, is_value_object, key_mapper, value_mapper)
+                    value = self.value_mapper(f.route, f.obj)
+                except BaseException as e2:
+                    e = e2
+                else:
+                    if not stack:
+                        return True, value
+                    self.deliver(stack[-1], f.attr, value)
+                    return False, None
+            # ошибка уходит родителю
+            if not stack:
+                raise e
+            if f.skip_on_error:
+                return False, None
+            f = stack.pop()
+            self.on_path.discard(f.oid)
+
+    def spend(self, value, key=None):
+        n = len(value) if type(value) is str else 8
+        if key is not None:
+            n += len(key) if type(key) is str else 8
+        self.bytes_left -= n
+        if self.bytes_left < 0:
+            self.exhausted = True
+
+
+# глубже этого рекурсивный обход сдается и уступает _DictDeepWalker (циклы, очень глубокие деревья)
+_FAST_MAX_DEPTH = 64
+
+
+class _NeedWalker(Exception):
+    """Вход не укладывается в бюджеты или слишком глубок (возможно, цикл) - нужен _DictDeepWalker"""
+
+
+class _FastDictDeep:
+    """
+    Рекурсивный обход для to_dict_deep по планам сериализации, без учета циклов и обрезки
+
+    Сдается (_NeedWalker), как только понадобилась бы отметка <max depth>/<cycle>/truncated:
+    при таком исходе результат совпадает с _DictDeepWalker.
+    """
+
+    __slots__ = ("is_value_object", "key_mapper", "value_mapper", "map_keys", "map_values", "max_depth",
+                 "max_items", "bytes_left")
+
+    def __init__(self, is_value_object, key_mapper, value_mapper, max_depth, max_items, max_bytes):
+        self.is_value_object = is_value_object
+        self.key_mapper = key_mapper
+        self.value_mapper = value_mapper
+        self.map_keys = key_mapper is not _keep_key
+        self.map_values = value_mapper is not _keep_value
+        self.max_depth = _FAST_MAX_DEPTH if max_depth is None else min(max_depth, _FAST_MAX_DEPTH)
+        self.max_items = max_items
+        self.bytes_left = max_bytes
+
+    def value(self, obj, route, depth):
+        if obj is None:
+            return None
+        is_value_object = self.is_value_object
+        plan = _dataclass_plans.get(type(obj))
+        if plan is not None and not is_value_object:
+            # для известного dataclass все проверки ниже заведомо ложны
+            return self.attrs(obj, plan, route, depth)
+        if isinstance(obj, Enum):
+            return self.value_mapper(route, obj.value)
+        if (is_value_object and is_value_object(route, obj)) or callable(obj):
+            return self.value_mapper(route, obj)
+        kind = _value_kind(type(obj))
+        if not isinstance(obj, dict) and ((not obj) or kind == _KIND_VALUE):
+            return self.value_mapper(route, obj)
+        if kind == _KIND_SEQUENCE:
+            return self.items(obj, route, depth)
+        if isinstance(obj, CaseInsensitiveDict):
+            obj = dict(obj)
+        return self.attrs(obj, _dataclass_plan(type(obj)), route, depth)
+
+    def items(self, obj, route, depth):
+        if depth > self.max_depth or (self.max_items is not None and len(obj) > self.max_items):
+            raise _NeedWalker
+        depth += 1
+        r = [self.value(x, route, depth) for x in obj]
+        if self.bytes_left is not None:
+            self.spend(r)
+        return r
+
+    def attrs(self, obj, plan, route, depth):
+        if depth > self.max_depth:
+            raise _NeedWalker
+        r = None
+        try:
+            # план не учитывает атрибуты, добавленные экземпляру вне полей dataclass
+            if plan is not None and len(obj.__dict__) == plan[1]:
+                names = plan[0]
+                items = zip(names, map(obj.__dict__.get, names))
+                size = len(names)
+                check_names = False
+            else:
+                items = to_dict(obj).items()
+                size = len(items)
+                check_names = True
+            if self.max_items is not None and size > self.max_items:
+                raise _NeedWalker
+            is_value_object = self.is_value_object
+            key_mapper = self.key_mapper
+            value_mapper = self.value_mapper
+            map_keys = self.map_keys
+            map_values = self.map_values
+            count_bytes = self.bytes_left is not None
+            # объем копится локально и списывается с бюджета один раз в конце узла
+            spent = 0
+            value_kinds = _value_kinds
+            depth += 1
+            for attr, value in items:
+                if value is None or (check_names and attr.startswith("_")):
+                    continue
+                new_route = (*route, attr) if map_keys else None
+                if map_keys:
+                    attr = key_mapper(new_route, attr)
+                kind = value_kinds.get(type(value))
+                if kind is None:
+                    kind = _value_kind(type(value))
+                if (is_value_object and is_value_object(route, value)) or kind == _KIND_VALUE:
+                    if map_values:
+                        value = value_mapper(route, value)
                     if not r:
                         r = {}
                     r.setdefault(attr, value)
-                except BaseException as e1:
-                    print("attr: ", attr, "\terror: ", e1)
-                    ...
-        return r
-    except BaseException as e:
-        print("out of for\t")
-        print("error: ", e)
-        return value_mapper(route, obj)
+                    if count_bytes:
+                        spent += (len(value) if type(value) is str else 8) + (len(attr) if type(attr) is str else 8)
+                    continue
+                if new_route is None:
+                    new_route = (*route, attr)
+                if kind == _KIND_SEQUENCE:
+                    value = self.items(value, new_route, depth)
+                else:
+                    try:
+                        value = self.value(value, new_route, depth)
+                    except _NeedWalker:
+                        raise
+                    except BaseException:
+                        # атрибут, который не удалось обойти, пропускается
+                        continue
+                if not r:
+                    r = {}
+                r.setdefault(attr, value)
+                if count_bytes:
+                    spent += (len(value) if type(value) is str else 8) + (len(attr) if type(attr) is str else 8)
+            if count_bytes:
+                self.bytes_left -= spent
+                if self.bytes_left < 0:
+                    raise _NeedWalker
+            return r
+        except _NeedWalker:
+            raise
+        except BaseException:
+            return self.value_mapper(route, obj)
+
+    def spend(self, values: list):
+        n = 0
+        for v in values:
+            n += len(v) if type(v) is str else 8
+        self.bytes_left -= n
+        if self.bytes_left < 0:
+            raise _NeedWalker
+
+
+def to_dict_deep(obj, route=(),
+                 is_value_object: Callable[[tuple, str], bool] = None,
+                 key_mapper: Callable[[tuple, str], str] = _keep_key,
+                 value_mapper: Callable[[tuple, Any], Any] = _keep_value,
+                 max_depth: int = None, max_items: int = None, max_bytes: int = None):
+    """
+    Превращает объект в дерево из dict/list/значений
+
+    Args:
+        max_depth: контейнеры глубже этого уровня (корень - 0) заменяются на "<max depth>"
+        max_items: сколько элементов коллекции или атрибутов объекта обходить, остальные
+            заменяются отметкой "...(truncated, total=N)"
+        max_bytes: примерный объем результата (длина строк, 8 на прочие значения),
+            по исчерпании обход прекращается
+
+    Объект, который уже обходится выше по пути (цикл), заменяется на "<cycle>".
+    """
+    try:
+        # обычный случай - ациклический вход в пределах бюджетов: рекурсия без учета пути
+        return _FastDictDeep(is_value_object, key_mapper, value_mapper, max_depth, max_items,
+                             max_bytes).value(obj, route, 0)
+    except (_NeedWalker, RecursionError):
+        pass
+    return _DictDeepWalker(is_value_object, key_mapper, value_mapper, max_depth, max_items, max_bytes).walk(obj, route)
 
 
 def convert_windows1251_to_utf8(text):
@@ -493,6 +1021,67 @@ def unescape_str(s: str):
     return s.encode('raw_unicode_escape').decode('unicode_escape')
 
 
+def _trie_pattern(words: list):
+    # слова -> регулярное выражение в форме префиксного дерева: "err(?:or|no)" вместо "error|errno",
+    # так на каждой позиции текста проверяется одна ветка дерева, а не все слова подряд
+    empty = words[0][:0]
+    trie = {}
+    for w in words:
+        node = trie
+        for i in range(len(w)):
+            node = node.setdefault(w[i:i + 1], {})
+        node[None] = True
+
+    # служебные части выражения того же типа, что слова
+    tok = (lambda x: x.encode()) if isinstance(empty, bytes) else (lambda x: x)
+
+    def build(node):
+        alts = [re.escape(ch) + build(child) for ch, child in sorted((k, v) for k, v in node.items() if k is not None)]
+        if not alts:
+            return empty
+        p = alts[0] if len(alts) == 1 else tok("(?:") + tok("|").join(alts) + tok(")")
+        if None in node:
+            # слово заканчивается здесь, но есть и более длинные с тем же началом
+            p = tok("(?:") + p + tok(")?")
+        return p
+
+    return build(trie)
+
+
+class WordsMatcher:
+    """
+    Поиск любого из набора слов за один проход по тексту
+
+    Слова компилируются один раз в общее регулярное выражение (префиксное дерево).
+    Ищет и в bytes (слова кодируются в encoding), и в str.
+
+    Args:
+        scan_limit: просматривать только первые scan_limit байт/символов
+    """
+
+    def __init__(self, words, scan_limit: int = None, encoding: str = "utf-8"):
+        words = [w for w in dict.fromkeys(words) if w]
+        self.words = words
+        self.scan_limit = scan_limit
+        self.encoding = encoding
+        self._bytes_words = {w.encode(encoding): w for w in words}
+        self._bytes_re = re.compile(_trie_pattern(list(self._bytes_words))) if words else None
+        self._str_re = None
+
+    def search(self, text, scan_limit: int = None) -> Optional[str]:
+        """Первое найденное слово или None"""
+        if text is None or self._bytes_re is None:
+            return None
+        limit = scan_limit or self.scan_limit or sys.maxsize
+        if isinstance(text, str):
+            if self._str_re is None:
+                self._str_re = re.compile(_trie_pattern(self.words))
+            m = self._str_re.search(text, 0, limit)
+            return m.group() if m else None
+        m = self._bytes_re.search(text, 0, limit)
+        return self._bytes_words[bytes(m.group())] if m else None
+
+
 def async_decorator(sync_decorator):
     def wrapper(func):
         @functools.wraps(func)
@@ -606,12 +1195,57 @@ def catch(_func=None, *, exception=None, handler=None, silent=False):
         return decorator_catch(_func)
 
 
-singleton_cache = {}
-cache_timestamps = {}
+singleton_caches: dict[str, TTLCache] = {}
+# имя кэша -> пространство имен его значений в общем уровне
+singleton_shared_caches: dict[str, str] = {}
+singleton_shared_tier: RedisCacheTier | None = None
 
 
-def clear_singleton_cache(key_prefix):
-    clear_dict_with_key_prefix(singleton_cache, key_prefix)
+def set_singleton_shared_tier(tier: RedisCacheTier | None):
+    """Включить общий уровень (L2) для @singleton(shared_ttl=...), например RedisService.make_cache_tier()"""
+    global singleton_shared_tier
+    singleton_shared_tier = tier
+
+
+def clear_singleton_cache(key_prefix=None, func=None):
+    """
+    Сбросить кэш @singleton
+
+    Значения в общем уровне (shared_ttl) удаляются вместе с локальными. Ключи общего уровня
+    не зависят от self, поэтому при key_prefix общий уровень функции сбрасывается целиком.
+
+    Args:
+        key_prefix: сбросить только значения, вычисленные для этого первого аргумента (например, self)
+        func: сбросить только кэш этой функции (декорированной функции или имени кэша)
+    """
+    if func is not None:
+        cache = func if isinstance(func, TTLCache) else getattr(func, "singleton_cache", None)
+        if cache is None:
+            cache = singleton_caches.get(func)
+        caches = [cache] if cache is not None else []
+    else:
+        caches = list(singleton_caches.values())
+
+    tier = singleton_shared_tier
+    if tier:
+        for cache in caches:
+            namespace = singleton_shared_caches.get(cache.name)
+            if namespace:
+                tier.clear(namespace)
+
+    if not key_prefix:
+        for cache in caches:
+            cache.clear()
+        return
+
+    key_prefix_hash = calc_hash(key_prefix)
+    for cache in caches:
+        cache.remove_group(key_prefix_hash)
+
+
+def get_singleton_cache_stats() -> dict[str, dict]:
+    return {name: {**cache.stats.summary(), "size": len(cache), "max_size": cache.max_size, "ttl": cache.ttl}
+            for name, cache in singleton_caches.items()}
 
 
 def calc_hash(k):
@@ -621,6 +1255,77 @@ def calc_hash(k):
         return str(id(k))
 
 
+_KWARGS_KEY = object()
+
+# типы, которые входят в ключ как есть: они не держат ссылок на объекты приложения
+_KEY_SCALARS = frozenset((str, int, float, bool, bytes, type(None)))
+
+
+def _hashed_key_part(v):
+    # прочие аргументы (в т.ч. self) входят в ключ только хэшем, чтобы кэш не удерживал их в памяти;
+    # кортеж из одного хэша не совпадет ни с одним скаляром
+    try:
+        return hash(v),
+    except TypeError:
+        return str(id(v)),
+
+
+def _singleton_key(args, kwargs):
+    key = []
+    for a in args:
+        key.append(a if type(a) in _KEY_SCALARS else _hashed_key_part(a))
+    if kwargs:
+        key.append(_KWARGS_KEY)
+        key.append(frozenset([(k, v if type(v) in _KEY_SCALARS else _hashed_key_part(v))
+                              for k, v in kwargs.items()]))
+    return tuple(key)
+
+
+def _singleton_key_group(key):
+    # группа записи - хэш первого аргумента, по ней работает clear_singleton_cache(key_prefix)
+    if not key or key[0] is _KWARGS_KEY:
+        return None
+    first = key[0]
+    return first[0] if type(first) is tuple else calc_hash(first)
+
+
+_STABLE_SCALARS = (type(None), bool, int, float, complex, str, bytes, Decimal, date, timedelta, uuid.UUID)
+
+
+def _stable_repr(v) -> str:
+    """
+    Представление значения, одинаковое во всех процессах
+
+    Множества и словари упорядочиваются (порядок их обхода зависит от PYTHONHASHSEED).
+    Объекты с repr вида <... at 0x...> не допускаются - TypeError.
+    """
+    if isinstance(v, _STABLE_SCALARS):
+        return repr(v)
+    if isinstance(v, Enum):
+        return f"{type(v).__qualname__}.{v.name}"
+    if isinstance(v, (list, tuple)):
+        return f"{type(v).__name__}({','.join(_stable_repr(x) for x in v)})"
+    if isinstance(v, (set, frozenset)):
+        return f"set({','.join(sorted(_stable_repr(x) for x in v))})"
+    if isinstance(v, dict):
+        return f"dict({','.join(sorted(f'{_stable_repr(k)}:{_stable_repr(x)}' for k, x in v.items()))})"
+    if dataclasses.is_dataclass(v) and not isinstance(v, type):
+        return f"{type(v).__qualname__}({','.join(_stable_repr(getattr(v, f.name)) for f in dataclasses.fields(v))})"
+    raise TypeError(f"{type(v).__qualname__} has no process-independent representation, "
+                    f"pass shared_key to @singleton")
+
+
+def _default_shared_key(func):
+    # self/cls не участвуют в ключе: их repr отличается в разных процессах
+    params = list(inspect.signature(func).parameters)
+    skip = 1 if params and params[0] in ("self", "cls") else 0
+
+    def shared_key(*args, **kwargs):
+        return md5(_stable_repr((args[skip:], kwargs)))
+
+    return shared_key
+
+
 def clear_dict_with_key_prefix(d: dict, key_prefix=None):
     if not key_prefix:
         d.clear()
@@ -633,54 +1338,114 @@ def clear_dict_with_key_prefix(d: dict, key_prefix=None):
 
 
 @omittable_parentheses()
-def singleton(ttl=None):
+def singleton(ttl=None, max_size=None, stale_while_revalidate=None, shared_ttl=None, shared_key=None,
+              shared_name=None):
+    """
+    Кэширует результат функции по ее аргументам
+
+    Args:
+        ttl: время жизни значения в секундах
+        max_size: максимальное количество значений (вытесняются давно не используемые)
+        stale_while_revalidate: сколько секунд после истечения ttl отдавать старое значение,
+            пока одно фоновое обновление вычисляет новое
+        shared_ttl: время жизни значения в общем уровне (см. set_singleton_shared_tier);
+            пока уровень не задан или shared_ttl не указан, кэш только локальный
+        shared_key: функция с сигнатурой декорируемой, возвращающая ключ для общего уровня;
+            по умолчанию - md5 от аргументов (без self/cls), которые должны быть примитивами,
+            Enum, dataclass или коллекциями из них - иначе вызов завершится TypeError
+        shared_name: пространство имен в общем уровне; по умолчанию - <модуль>.<qualname> функции.
+            Обязательно, если с shared_ttl декорируется функция с уже занятым именем (вложенная,
+            повторно объявленная): иначе процессы назвали бы ее по-разному и не делили бы значения
+
+    Строки, числа, bool, bytes и None входят в ключ как есть, остальные аргументы (в т.ч. self) -
+    только хэшем: кэш не удерживает их в памяти.
+    """
+
     def decorator(func):
 
         is_async = inspect.iscoroutinefunction(func)
+        name = namespace = f"{func.__module__}.{func.__qualname__}"
+        if name in singleton_caches:
+            if shared_ttl and not shared_name:
+                raise ValueError(f"singleton cache name {name} is already taken, pass shared_name")
+            # суффикс зависит от порядка импорта, поэтому годится только для локального кэша
+            name = f"{name}#{len(singleton_caches)}"
+        cache = TTLCache(name=name, max_size=max_size, ttl=ttl, stale_ttl=stale_while_revalidate,
+                         index_key=_singleton_key_group)
+        singleton_caches[name] = cache
+        if shared_ttl:
+            namespace = shared_name or namespace
+            singleton_shared_caches[name] = namespace
+        flight = AsyncSingleFlight() if is_async else SingleFlight()
+        make_shared_key = shared_key or (_default_shared_key(func) if shared_ttl else None)
 
         @functools.wraps(func)
         async def async_wrapper(*args, **kwargs):
-            nonlocal ttl
-            key = args
-
-            if kwargs:
-                key += (frozenset(kwargs.items()),)
+            key = _singleton_key(args, kwargs)
 
-            key = tuple(calc_hash(k) for k in key + (get_method_name(func),))
+            if cache.stale_ttl:
+                r, fresh = cache.get_stale(key)
+                if r is MISSING:
+                    return await flight.do(key, lambda: async_load(key, args, kwargs))
+                if not fresh:
+                    flight.submit(key, lambda: async_load(key, args, kwargs))
+                return r
 
-            if key in cache_timestamps:
-                if ttl is not None and 0 < ttl < (time.time() - cache_timestamps[key]):
-                    del singleton_cache[key]
-                    del cache_timestamps[key]
+            r = cache.get(key)
+            if r is MISSING:
+                r = await flight.do(key, lambda: async_load(key, args, kwargs))
 
-            if key not in singleton_cache:
-                singleton_cache[key] = await func(*args, **kwargs)
-                cache_timestamps[key] = time.time()
+            return r
 
-            return singleton_cache[key]
+        async def async_load(key, args, kwargs):
+            v = cache.peek(key)
+            if v is MISSING:
+                tier = singleton_shared_tier if shared_ttl else None
+                if tier:
+                    skey = make_shared_key(*args, **kwargs)
+                    v = await asyncio.to_thread(tier.get, namespace, skey)
+                if v is MISSING:
+                    v = await func(*args, **kwargs)
+                    if tier:
+                        await asyncio.to_thread(tier.set, namespace, skey, v, shared_ttl)
+                cache.set(key, v)
+            return v
 
         @functools.wraps(func)
         def sync_wrapper(*args, **kwargs):
-            nonlocal ttl
-            key = args
-
-            if kwargs:
-                key += (frozenset(kwargs.items()),)
+            key = _singleton_key(args, kwargs)
 
-            key = tuple(calc_hash(k) for k in key + (get_method_name(func),))
+            if cache.stale_ttl:
+                r, fresh = cache.get_stale(key)
+                if r is MISSING:
+                    return flight.do(key, lambda: sync_load(key, args, kwargs))
+                if not fresh:
+                    flight.submit(key, lambda: sync_load(key, args, kwargs), _DEFAULT_POOL)
+                return r
 
-            if key in cache_timestamps:
-                if ttl is not None and 0 < ttl < (time.time() - cache_timestamps[key]):
-                    del singleton_cache[key]
-                    del cache_timestamps[key]
+            r = cache.get(key)
+            if r is MISSING:
+                r = flight.do(key, lambda: sync_load(key, args, kwargs))
 
-            if key not in singleton_cache:
-                singleton_cache[key] = func(*args, **kwargs)
-                cache_timestamps[key] = time.time()
-
-            return singleton_cache[key]
+            return r
 
-        return async_wrapper if is_async else sync_wrapper
+        def sync_load(key, args, kwargs):
+            v = cache.peek(key)
+            if v is MISSING:
+                tier = singleton_shared_tier if shared_ttl else None
+                if tier:
+                    skey = make_shared_key(*args, **kwargs)
+                    v = tier.get(namespace, skey)
+                if v is MISSING:
+                    v = func(*args, **kwargs)
+                    if tier:
+                        tier.set(namespace, skey, v, shared_ttl)
+                cache.set(key, v)
+            return v
+
+        wrapper = async_wrapper if is_async else sync_wrapper
+        wrapper.singleton_cache = cache
+        return wrapper
 
     return decorator
 
@@ -689,10 +1454,10 @@ class SingletonCache:
     def __init__(self):
         self._lazy_singletons = {}
 
-    def get_singleton_decorator(self, ttl):
-        if ttl not in self._lazy_singletons:
-            self._lazy_singletons[ttl] = singleton(ttl=ttl)
-        return self._lazy_singletons[ttl]
+    def get_singleton_decorator(self, ttl, max_size=None):
+        if (ttl, max_size) not in self._lazy_singletons:
+            self._lazy_singletons[(ttl, max_size)] = singleton(ttl=ttl, max_size=max_size)
+        return self._lazy_singletons[(ttl, max_size)]
 
 
 def scheduled(everyday_time):
@@ -899,6 +1664,11 @@ class UrlCheckResult:
     status: str | None = None
     error: str | None = None
     method: str = None
+    # фазы проверки (probe_tcp), мс
+    dns_ms: float = None
+    connect_ms: float = None
+    tls_ms: float = None
+    banner: str = None
 
 
 def check_url_availability_with_socket(host, port, timeout=3) -> UrlCheckResult:
@@ -932,47 +1702,84 @@ def check_url_availability_by_url(url: str, timeout: int = 3, session: Session =
             return r
 
     host, port = parse_url(url)
-    r = check_url_availability_with_socket(host, port, timeout)
-    if not r.error:
-        return r
-
-    return check_with_telnet(host, port, timeout)
+    return probe_tcp(host, port, timeout)
 
 
-def check_with_telnet(host, port, timeout=3) -> UrlCheckResult:
-    result = UrlCheckResult(host=host, port=port, method="telnet")
+def _ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 2)
 
-    start = time.time()
 
-    # Команда: автоматически отправляем "quit", чтобы telnet завершился
-    cmd = [
-        "sh", "-c",
-        f"(echo quit) | timeout {timeout} telnet {host} {port}"
-    ]
+def probe_tcp(host, port, timeout: float = 3, tls: bool = False, verify: bool = True, server_hostname: str = None,
+              read_banner: bool = False, banner_bytes: int = 256, banner_timeout: float = 0.5) -> UrlCheckResult:
+    """
+    Проверить TCP-порт в процессе: DNS, соединение, при tls - TLS-рукопожатие, при read_banner - чтение приветствия
 
+    Время каждой фазы - в dns_ms, connect_ms, tls_ms; timeout - на все фазы вместе.
+    Молчащий сервер (баннер не пришел за banner_timeout) считается доступным.
+    """
+    r = UrlCheckResult(host=host, port=port, status="available", method="tcp")
+    start = time.perf_counter()
+    deadline = start + timeout
+    phase = "dns"
+    sock = None
     try:
-        proc = subprocess.run(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-
-        result.response_time_ms = (time.time() - start) * 1000
-
-        output = proc.stdout + proc.stderr
-
-        if "Connected" in output or "Escape character" in output:
-            result.status = "OK"
-        else:
-            result.status = "FAIL"
-            result.error = output.strip()
-
+        t = time.perf_counter()
+        addrs = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        r.dns_ms = _ms(t)
+
+        phase = "connect"
+        t = time.perf_counter()
+        err = None
+        for family, type_, proto, _, addr in addrs:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                raise socket.timeout("timed out")
+            sock = socket.socket(family, type_, proto)
+            sock.settimeout(remaining)
+            try:
+                sock.connect(addr)
+                err = None
+                break
+            except OSError as e:
+                sock.close()
+                sock = None
+                err = e
+        if err is not None:
+            raise err
+        r.connect_ms = _ms(t)
+
+        if tls:
+            phase = "tls"
+            t = time.perf_counter()
+            context = ssl.create_default_context()
+            if not verify:
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+            sock.settimeout(max(0.001, deadline - time.perf_counter()))
+            sock = context.wrap_socket(sock, server_hostname=server_hostname or host)
+            r.tls_ms = _ms(t)
+
+        if read_banner:
+            phase = "banner"
+            sock.settimeout(max(0.001, min(banner_timeout, deadline - time.perf_counter())))
+            try:
+                data = sock.recv(banner_bytes)
+                r.banner = data.decode("utf-8", "replace").strip() or None
+            except socket.timeout:
+                pass
     except Exception as e:
-        result.status = "unavailable"
-        result.error = str(e)
+        r.status = "unavailable"
+        r.error = f"{phase}: {str(e) or type(e).__name__}"
+    finally:
+        if sock is not None:
+            sock.close()
+        r.response_time_ms = _ms(start)
+    return r
 
-    return result
+
+def check_with_telnet(host, port, timeout=3) -> UrlCheckResult:
+    # раньше запускал telnet в подпроцессе; оставлено для совместимости
+    return probe_tcp(host, port, timeout, read_banner=True)
 
 
 def parse_url(url):
@@ -980,7 +1787,7 @@ def parse_url(url):
     host = parsed.hostname
     port = parsed.port
     if not port:
-        port = 443 if host.startswith("https") else 80
+        port = 443 if parsed.scheme == "https" else 80
     return host, port
 
 
@@ -1003,6 +1810,118 @@ def check_url_availability_by_url_with_http_request(url: str, timeout: int = 3,
         return r
 
 
+async def _check_socket_async(host, port, timeout) -> UrlCheckResult:
+    start = time.perf_counter()
+    r = UrlCheckResult(host=host, port=port, status="available", method="socket")
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        writer.close()
+    except BaseException as e:
+        if isinstance(e, asyncio.CancelledError):
+            raise
+        r.status = "unavailable"
+        r.error = str(e) or type(e).__name__
+    r.response_time_ms = round((time.perf_counter() - start) * 1000, 2)
+    return r
+
+
+async def _check_http_head_async(url, host, port, timeout) -> UrlCheckResult:
+    # HEAD без сторонних клиентов: любой ответ сервера означает, что он доступен
+    parsed = urlparse(url)
+    start = time.perf_counter()
+    r = UrlCheckResult(host=host, port=port, status="available", method="http_request")
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port, ssl=True if parsed.scheme == "https" else None), timeout)
+        target = (parsed.path or "/") + (f"?{parsed.query}" if parsed.query else "")
+        writer.write(f"HEAD {target} HTTP/1.1\r\nHost: {parsed.netloc}\r\nConnection: close\r\n\r\n".encode())
+        await writer.drain()
+        line = await asyncio.wait_for(reader.readline(), max(0.0, timeout - (time.perf_counter() - start)))
+        if not line.startswith(b"HTTP/"):
+            raise ConnectionError(f"not an http response: {line[:100]!r}")
+    except BaseException as e:
+        if isinstance(e, asyncio.CancelledError):
+            raise
+        r.status = "unavailable"
+        r.error = str(e) or type(e).__name__
+    finally:
+        if writer is not None:
+            writer.close()
+    r.response_time_ms = round((time.perf_counter() - start) * 1000, 2)
+    return r
+
+
+async def _check_url_availability_async(url: str, timeout: float, reachable: dict = None) -> UrlCheckResult:
+    key = url
+    if "://" not in url:
+        # host:port без схемы
+        url = "tcp://" + url
+    host, port = parse_url(url)
+    if not url.startswith("http"):
+        return await _check_socket_async(host, port, timeout)
+    # HEAD и соединение сокетом параллельно - в сумме не дольше одной проверки
+    head_task = asyncio.ensure_future(_check_http_head_async(url, host, port, timeout))
+    sock_task = asyncio.ensure_future(_check_socket_async(host, port, timeout))
+    try:
+        sock = await sock_task
+        if not sock.error and reachable is not None:
+            # порт принимает соединения: это и есть ответ, если HEAD не успеет
+            reachable[key] = sock
+        head = await head_task
+    except BaseException:
+        head_task.cancel()
+        sock_task.cancel()
+        raise
+    return head if not head.error else sock
+
+
+async def check_urls_availability_async(urls, timeout: float = 3, deadline: float = None) -> dict[str, UrlCheckResult]:
+    """
+    Проверить доступность многих URL одновременно (HTTP HEAD и соединение сокетом, без telnet)
+
+    Args:
+        timeout: таймаут одной проверки
+        deadline: общий предел времени; не успевшие цели получают результат проверки сокетом,
+            если она уже прошла, иначе status="unavailable"
+
+    Returns:
+        dict: url -> UrlCheckResult
+    """
+    urls = list(dict.fromkeys(urls))
+    reachable = {}
+    tasks = {url: asyncio.ensure_future(_check_url_availability_async(url, timeout, reachable)) for url in urls}
+    if tasks:
+        await asyncio.wait(tasks.values(), timeout=deadline)
+    r = {}
+    for url, task in tasks.items():
+        if task.done() and not task.cancelled() and task.exception() is None:
+            r[url] = task.result()
+            continue
+        task.cancel()
+        if url in reachable:
+            r[url] = reachable[url]
+            continue
+        try:
+            host, port = parse_url(url if "://" in url else "tcp://" + url)
+        except Exception:
+            host, port = None, None
+        error = "deadline exceeded" if not task.done() else str(task.exception())
+        r[url] = UrlCheckResult(host=host, port=port, status="unavailable", error=error)
+    return r
+
+
+def check_urls_availability(urls, timeout: float = 3, deadline: float = None) -> dict[str, UrlCheckResult]:
+    """Синхронная обертка над check_urls_availability_async (в т.ч. из потока с работающим event loop)"""
+    coro = check_urls_availability_async(urls, timeout, deadline)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
+
+
 def remove_last_path_fragments(url: str, n: int = 1) -> str:
     parsed = urlparse(url)
 
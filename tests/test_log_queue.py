@@ -0,0 +1,97 @@
+import logging
+import threading
+
+from src.mybootstrap_core_itskovichanton.log_queue import QueueLogHandler, OVERFLOW_BLOCK
+
+
+class _ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class _FailingHandler(logging.Handler):
+    def __init__(self, exc):
+        super().__init__()
+        self.exc = exc
+
+    def emit(self, record):
+        raise self.exc
+
+    def handleError(self, record):
+        pass
+
+
+def _record(msg="x", level=logging.INFO):
+    return logging.LogRecord("test", level, __file__, 1, msg, None, None)
+
+
+def _call_with_timeout(fn, timeout=5.0):
+    r = []
+    t = threading.Thread(target=lambda: r.append(fn()), daemon=True)
+    t.start()
+    t.join(timeout)
+    assert not t.is_alive(), "call hung"
+    return r[0]
+
+
+def test_writes_records():
+    target = _ListHandler()
+    h = QueueLogHandler(target, capacity=100)
+    for i in range(10):
+        h.handle(_record(str(i)))
+    assert h.flush(5)
+    assert [r.msg for r in target.records] == [str(i) for i in range(10)]
+    h.close()
+
+
+def test_failing_handler_does_not_kill_writer():
+    target = _ListHandler()
+    h = QueueLogHandler([_FailingHandler(RecursionError()), _FailingHandler(SystemExit()), target], capacity=10)
+    for i in range(5):
+        h.handle(_record(str(i)))
+    assert h.flush(5)
+    assert h._writer.is_alive()
+    assert len(target.records) == 5
+    assert h.stats.errors == 10
+    h.close()
+
+
+def test_dead_writer_does_not_block_callers():
+    h = QueueLogHandler(_ListHandler(), capacity=1, overflow=OVERFLOW_BLOCK, block_timeout=None)
+    # писатель завершился, не дописав очередь
+    with h._cond:
+        h._closed = True
+        h._cond.notify_all()
+    h._writer.join(5)
+    h._closed = False
+    h._queue.append(_record())
+
+    assert _call_with_timeout(lambda: h.enqueue(_record())) is False
+    assert _call_with_timeout(lambda: h.flush()) is False
+    assert h.stats.dropped == 1
+
+
+def test_blocked_callers_wake_up_when_writer_dies():
+    crash = threading.Event()
+
+    class _CrashingQueue(QueueLogHandler):
+        def _loop(self):
+            crash.wait()
+            raise RuntimeError("writer crashed")
+
+    h = _CrashingQueue(_ListHandler(), capacity=1, overflow=OVERFLOW_BLOCK, block_timeout=None)
+    assert h.enqueue(_record())
+    blocked = threading.Thread(target=lambda: h.enqueue(_record()), daemon=True)
+    blocked.start()
+    blocked.join(0.2)
+    assert blocked.is_alive()
+
+    crash.set()
+    blocked.join(5)
+    assert not blocked.is_alive()
+    assert h.stats.dropped == 1
+    assert _call_with_timeout(lambda: h.enqueue(_record())) is False
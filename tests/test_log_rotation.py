@@ -0,0 +1,109 @@
+import logging
+import os
+import threading
+import time
+import zlib
+
+from src.mybootstrap_core_itskovichanton import log_rotation
+from src.mybootstrap_core_itskovichanton.log_rotation import RolloverWorker, archive_path, BackupRetention
+from src.mybootstrap_core_itskovichanton.logger import TimedCompressedRotatingFileHandler
+
+
+def _record(msg):
+    return logging.LogRecord("test", logging.INFO, __file__, 1, msg, None, None)
+
+
+def _make_backups(base, n, ext=""):
+    # n файлов ротации за n дней до вчерашнего, от старых к новым
+    day = 86400
+    names = []
+    for i in range(n, 0, -1):
+        name = base + "." + time.strftime("%Y-%m-%d", time.localtime(time.time() - (i + 1) * day)) + ext
+        with open(name, "wb") as f:
+            f.write(b"x" * 10)
+        names.append(name)
+    return names
+
+
+def _read_gz_prefix(path) -> bytes:
+    # незавершенный gzip-член: читаем то, что уже сброшено на диск
+    with open(path, "rb") as f:
+        return zlib.decompressobj(zlib.MAX_WBITS | 16).decompress(f.read())
+
+
+def test_delayed_jobs_run_after_delay_and_do_not_block_wait():
+    w = RolloverWorker(name="test-rollover")
+    done = threading.Event()
+    start = time.monotonic()
+    w.submit_later(done.set, 0.2)
+    assert w.wait(1)
+    assert not done.is_set()
+    assert done.wait(2)
+    assert time.monotonic() - start >= 0.2
+
+
+def test_quiet_log_tail_is_flushed_by_timer(tmp_path):
+    h = TimedCompressedRotatingFileHandler(str(tmp_path / "app.log"), archive_type="gz",
+                                           worker=RolloverWorker(name="test-rollover"),
+                                           compress_flush_interval=0.2)
+    h.setFormatter(logging.Formatter("%(message)s"))
+    # обе записи попадают в интервал троттлинга flush, дальше лог молчит
+    h.handle(_record("first"))
+    h.handle(_record("tail"))
+    time.sleep(0.6)
+    assert b"tail" in _read_gz_prefix(archive_path(h.baseFilename, "gz"))
+    h.close()
+
+
+def test_rollover_time_comes_from_live_stream_file(tmp_path):
+    base = str(tmp_path / "app.log")
+    live = archive_path(base, "gz")
+    with open(live, "wb"):
+        pass
+    yesterday = time.time() - 86400
+    os.utime(live, (yesterday, yesterday))
+
+    h = TimedCompressedRotatingFileHandler(base, when="midnight", archive_type="gz",
+                                           worker=RolloverWorker(name="test-rollover"))
+    assert h.rolloverAt <= time.time()
+    h.close()
+
+
+def test_retention_keeps_backup_count_newest(tmp_path):
+    base = str(tmp_path / "app.log")
+    backups = _make_backups(base, 6, ".gz")
+    h = TimedCompressedRotatingFileHandler(base, when="midnight", backup_count=3, archive_type="gz",
+                                           worker=RolloverWorker(name="test-rollover"))
+    assert len(h.retention) == 6
+    h.handle(_record("line"))
+    h.doRollover()
+    assert h.wait_for_rollovers(5)
+
+    left = sorted(f for f in os.listdir(tmp_path) if f != "app.log.gz")
+    assert len(left) == 3
+    # остались два самых новых старых файла и только что ротированный
+    assert left[:2] == [os.path.basename(f) for f in backups[-2:]]
+    assert h.retention.removed == 4
+    assert h.retention.errors == 0
+    h.close()
+
+
+def test_retention_counts_removal_failures(tmp_path, monkeypatch):
+    base = str(tmp_path / "app.log")
+    backups = _make_backups(base, 5)
+    remove = os.remove
+
+    def failing_remove(path):
+        if path == backups[0]:
+            raise PermissionError("locked")
+        remove(path)
+
+    monkeypatch.setattr(log_rotation.os, "remove", failing_remove)
+    r = BackupRetention(base, "%Y-%m-%d", max_count=2)
+    assert r.prune() == backups[1:3]
+    # неудаленный файл выпадает из индекса, лимит соблюдается по остальным
+    assert len(r) == 2
+    assert r.removed == 2
+    assert r.errors == 1
+    assert r.last_error == "locked"
+    assert sorted(os.listdir(tmp_path)) == sorted(os.path.basename(f) for f in [backups[0]] + backups[3:])
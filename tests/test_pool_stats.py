@@ -0,0 +1,76 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+from urllib3.exceptions import EmptyPoolError
+
+from src.mybootstrap_core_itskovichanton.logger import StatsHTTPAdapter, PoolConfig
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b"ok"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        if self.path == "/close":
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def _session(config: PoolConfig = None):
+    adapter = StatsHTTPAdapter(config)
+    s = requests.Session()
+    s.mount("http://", adapter)
+    return s, adapter.pool_stats
+
+
+def test_keep_alive_connection_is_reused(server_url):
+    s, stats = _session()
+    with s:
+        for _ in range(3):
+            assert s.get(server_url + "/").text == "ok"
+    assert (stats.checkouts, stats.new_connections, stats.reused_connections) == (3, 1, 2)
+    assert stats.reuse_ratio == pytest.approx(2 / 3)
+    assert stats.timeouts == 0
+
+
+def test_closed_connection_is_not_counted_as_reused(server_url):
+    s, stats = _session()
+    with s:
+        for _ in range(3):
+            assert s.get(server_url + "/close").text == "ok"
+    # сервер закрывает соединение после каждого ответа - каждый раз подключаемся заново
+    assert (stats.checkouts, stats.new_connections, stats.reused_connections) == (3, 3, 0)
+    assert stats.reuse_ratio == 0.0
+
+
+def test_exhausted_blocking_pool_counts_timeout(server_url):
+    s, stats = _session(PoolConfig(pool_maxsize=1, pool_block=True, pool_timeout=0.2))
+    with s:
+        # непрочитанный потоковый ответ держит единственное соединение
+        held = s.get(server_url + "/", stream=True)
+        with pytest.raises(EmptyPoolError):
+            s.get(server_url + "/")
+        # дочитанный ответ возвращает соединение в пул
+        assert held.text == "ok"
+        assert s.get(server_url + "/").text == "ok"
+    assert stats.timeouts == 1
+    assert (stats.checkouts, stats.new_connections, stats.reused_connections) == (2, 1, 1)
@@ -0,0 +1,52 @@
+import json
+import time
+
+from src.mybootstrap_core_itskovichanton.logger import RequestStats, merge_request_stats
+from src.mybootstrap_core_itskovichanton.stats.latency_histogram import LatencyHistogram
+
+
+def _stats(times, status="200", last_time=None, last_err=None):
+    st = RequestStats()
+    for t in times:
+        st.record_time(t, status)
+        st.response_statuses[status] += 1
+        st.connection_success_count += 1
+    st.last_time = last_time
+    st.last_err = last_err
+    return st
+
+
+def test_histogram_round_trip():
+    h = LatencyHistogram()
+    for t in (0.01, 0.02, 0.5, 3.0):
+        h.record(t)
+    r = LatencyHistogram.from_dict(json.loads(json.dumps(h.to_dict())))
+    assert r.summary() == h.summary()
+
+
+def test_request_stats_round_trip_through_json():
+    st = _stats([0.1, 0.2, 0.3], last_time=time.time(), last_err="timeout")
+    st.transfer_latency.record(1.5)
+    st.bytes_received = 100
+    r = RequestStats.from_dict(json.loads(json.dumps(st.to_dict())))
+    assert json.dumps(r.to_dict(), sort_keys=True) == json.dumps(st.to_dict(), sort_keys=True)
+    assert r.summary()["p95_time"] == st.summary()["p95_time"]
+    assert r.latency_by_status["200"].count == 3
+
+
+def test_merge_stats_from_other_process():
+    now = time.time()
+    local = {"/a": _stats([0.1], last_time=now - 10, last_err="old")}
+    # статистика другого процесса приходит сериализованной
+    remote = {"/a": _stats([0.2, 0.3], last_time=now, last_err="new").to_dict(),
+              "/b": _stats([1.0], "500", last_time=now).to_dict()}
+    merged = merge_request_stats(local, json.loads(json.dumps(remote)))
+
+    a = merged["/a"]
+    assert a.latency.count == 3
+    assert a.connection_success_count == 3
+    assert a.response_statuses["200"] == 3
+    assert a.last_time == now
+    assert a.last_err == "new"
+    assert merged["/b"].latency_by_status["500"].count == 1
+    assert 0 <= a.summary()["ago_sec"] < 5
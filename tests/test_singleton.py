@@ -0,0 +1,128 @@
+import asyncio
+import threading
+import time
+
+from src.mybootstrap_core_itskovichanton.utils import singleton
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_stale_hit_returns_old_value_and_refreshes_once():
+    calls = []
+    release = threading.Event()
+
+    @singleton(ttl=0.1, stale_while_revalidate=5)
+    def f(x):
+        calls.append(x)
+        if len(calls) > 1:
+            # обновление держим, пока не накопятся устаревшие попадания
+            release.wait(5)
+        return len(calls)
+
+    assert f(1) == 1
+    time.sleep(0.15)
+    assert [f(1) for _ in range(10)] == [1] * 10
+    release.set()
+    _wait_for(lambda: f.singleton_cache.peek((1,), None) == 2)
+    assert calls == [1, 1]
+    assert f(1) == 2
+    assert f.singleton_cache.stats.stale_hits >= 10
+
+
+def test_stale_value_expires_after_ttl_plus_stale_ttl():
+    calls = []
+
+    @singleton(ttl=0.05, stale_while_revalidate=0.1)
+    def f(x):
+        calls.append(x)
+        return len(calls)
+
+    assert f(1) == 1
+    time.sleep(0.2)
+    # устаревшее значение уже не отдается - вычисляется заново в вызывающем потоке
+    assert f(1) == 2
+    assert calls == [1, 1]
+
+
+def test_async_stale_hit_refreshes_in_background():
+    calls = []
+
+    @singleton(ttl=0.3, stale_while_revalidate=5)
+    async def f(x):
+        calls.append(x)
+        await asyncio.sleep(0.05)
+        return len(calls)
+
+    async def main():
+        assert await f(1) == 1
+        await asyncio.sleep(0.35)
+        assert await asyncio.gather(*(f(1) for _ in range(10))) == [1] * 10
+        await asyncio.sleep(0.15)
+        assert await f(1) == 2
+
+    asyncio.run(main())
+    assert calls == [1, 1]
+
+
+def test_concurrent_misses_compute_once():
+    calls = []
+
+    @singleton
+    def f(x):
+        calls.append(x)
+        time.sleep(0.1)
+        return x * 2
+
+    barrier = threading.Barrier(10)
+    results = []
+
+    def worker():
+        barrier.wait()
+        results.append(f(21))
+
+    threads = [threading.Thread(target=worker) for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == [42] * 10
+    assert calls == [21]
+
+
+def test_async_concurrent_misses_compute_once():
+    calls = []
+
+    @singleton
+    async def f(x):
+        calls.append(x)
+        await asyncio.sleep(0.05)
+        return x * 2
+
+    async def main():
+        return await asyncio.gather(*(f(21) for _ in range(10)))
+
+    assert asyncio.run(main()) == [42] * 10
+    assert calls == [21]
+
+
+def test_failed_load_is_not_cached():
+    calls = []
+
+    @singleton
+    def f(x):
+        calls.append(x)
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+        return x
+
+    try:
+        f(1)
+    except RuntimeError:
+        pass
+    assert f(1) == 1
+    assert calls == [1, 1]
@@ -0,0 +1,159 @@
+import threading
+import time
+from dataclasses import dataclass
+
+import fakeredis
+import pytest
+
+from src.mybootstrap_core_itskovichanton.cache import RedisCacheTier
+from src.mybootstrap_core_itskovichanton.utils import singleton, set_singleton_shared_tier, clear_singleton_cache
+
+
+@pytest.fixture
+def tier():
+    r = RedisCacheTier(fakeredis.FakeRedis(), prefix="test")
+    set_singleton_shared_tier(r)
+    yield r
+    set_singleton_shared_tier(None)
+
+
+def _forget_locally(f):
+    # как будто значение запрашивает другой процесс: локального кэша нет, общий уровень есть
+    f.singleton_cache.clear()
+
+
+def test_miss_then_hit_from_shared_tier(tier):
+    calls = []
+
+    @singleton(shared_ttl=60)
+    def f(x):
+        calls.append(x)
+        return x * 2
+
+    assert f(2) == 4
+    assert tier.stats.misses == 1
+    _forget_locally(f)
+    assert f(2) == 4
+    assert calls == [2]
+    assert tier.stats.hits == 1
+
+
+def test_shared_value_expires(tier):
+    calls = []
+
+    @singleton(ttl=0.1, shared_ttl=0.2)
+    def f(x):
+        calls.append(x)
+        return len(calls)
+
+    assert f(1) == 1
+    _forget_locally(f)
+    assert f(1) == 1
+    time.sleep(0.3)
+    assert f(1) == 2
+
+
+def test_clear_removes_shared_values(tier):
+    calls = []
+
+    class Service:
+        @singleton(shared_ttl=60)
+        def get(self, x):
+            calls.append(x)
+            return len(calls)
+
+    s = Service()
+    assert s.get(1) == 1
+    clear_singleton_cache(func=Service.get)
+    assert s.get(1) == 2
+
+    # ключи общего уровня не зависят от self - сбрасывается весь кэш функции
+    clear_singleton_cache(key_prefix=s, func=Service.get)
+    assert s.get(1) == 3
+
+    clear_singleton_cache()
+    assert s.get(1) == 4
+
+
+def test_concurrent_misses_compute_once(tier):
+    calls = []
+
+    @singleton(shared_ttl=60)
+    def f(x):
+        calls.append(x)
+        time.sleep(0.1)
+        return x
+
+    barrier = threading.Barrier(10)
+    results = []
+
+    def worker():
+        barrier.wait()
+        results.append(f(7))
+
+    threads = [threading.Thread(target=worker) for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == [7] * 10
+    assert calls == [7]
+    assert tier.stats.misses == 1
+
+
+@dataclass(frozen=True)
+class _Query:
+    name: str
+    tags: frozenset
+
+
+def test_default_shared_key_is_process_independent(tier):
+    @singleton(shared_ttl=60)
+    def f(q, opts=None):
+        return q.name
+
+    assert f(_Query("a", frozenset({"x", "y", "z"})), opts={"b": 1, "a": 2}) == "a"
+    _forget_locally(f)
+    assert f(_Query("a", frozenset({"z", "y", "x"})), opts={"a": 2, "b": 1}) == "a"
+    assert tier.stats.hits == 1
+
+    with pytest.raises(TypeError):
+        f(object())
+
+
+def test_explicit_shared_key_accepts_any_arguments(tier):
+    @singleton(shared_ttl=60, shared_key=lambda obj: obj.__class__.__name__)
+    def f(obj):
+        return 1
+
+    assert f(object()) == 1
+
+
+def test_shared_namespace_does_not_depend_on_declaration_order(tier):
+    def declare(name):
+        @singleton(shared_ttl=60, shared_name=name)
+        def f(x):
+            return object()
+
+        return f
+
+    # одна и та же вложенная функция в двух "процессах": локальные кэши разные, общий уровень один
+    first, second = declare("test.shared_namespace"), declare("test.shared_namespace")
+    assert first.singleton_cache.name != second.singleton_cache.name
+    first(1)
+    second(1)
+    assert tier.stats.hits == 1
+
+
+def test_taken_name_requires_shared_name(tier):
+    def declare():
+        @singleton(shared_ttl=60)
+        def f(x):
+            return x
+
+        return f
+
+    declare()
+    with pytest.raises(ValueError):
+        declare()
@@ -0,0 +1,56 @@
+from dataclasses import dataclass, field
+
+import pytest
+
+from src.mybootstrap_core_itskovichanton.utils import to_dict_deep, _DictDeepWalker, _keep_key, _keep_value, \
+    CYCLE_MARKER, MAX_DEPTH_MARKER
+
+
+@dataclass
+class Node:
+    name: str = "n"
+    children: list = field(default_factory=list)
+    ref: object = None
+
+
+def _chain(n):
+    root = cur = Node("0")
+    for i in range(1, n):
+        cur.ref = Node(str(i))
+        cur = cur.ref
+    return root
+
+
+def _walker(obj, max_depth=None, max_items=None, max_bytes=None):
+    return _DictDeepWalker(None, _keep_key, _keep_value, max_depth, max_items, max_bytes).walk(obj, ())
+
+
+def test_plain_tree():
+    assert to_dict_deep(Node("a", [Node("b")])) == {"name": "a", "children": [{"name": "b", "children": []}]}
+
+
+def test_cycle_is_replaced_by_marker():
+    a = Node("a")
+    a.ref = Node("b", ref=a)
+    assert to_dict_deep(a) == {"name": "a", "children": [], "ref": {"name": "b", "children": [], "ref": CYCLE_MARKER}}
+
+
+def test_deep_chain_does_not_hit_recursion_limit():
+    r = to_dict_deep(_chain(5000))
+    assert r["ref"]["ref"]["name"] == "2"
+
+
+def test_budgets():
+    assert to_dict_deep(_chain(5), max_depth=1)["ref"]["ref"] == MAX_DEPTH_MARKER
+    r = to_dict_deep(Node(children=[Node(str(i)) for i in range(10)]), max_items=3)
+    assert len(r["children"]) == 4
+    assert r["children"][-1] == "...(truncated, total=10)"
+    assert "...(truncated)" in str(to_dict_deep({"s": ["x" * 100] * 100}, max_bytes=1000))
+
+
+@pytest.mark.parametrize("kw", [{}, {"max_depth": 2}, {"max_items": 3}, {"max_bytes": 300},
+                                {"max_depth": 32, "max_items": 500, "max_bytes": 256 * 1024}])
+def test_fast_path_matches_walker(kw):
+    shared = Node("shared")
+    tree = Node("root", [Node(str(i), [shared, shared]) for i in range(5)], ref=_chain(10))
+    assert to_dict_deep(tree, **kw) == _walker(tree, **kw)
@@ -0,0 +1,55 @@
+import time
+
+from src.mybootstrap_core_itskovichanton.cache import TTLCache
+
+
+def test_expiry_queue_bounded_by_max_size():
+    c = TTLCache(max_size=10, ttl=3600)
+    for i in range(200_000):
+        c.set(i, i)
+    assert len(c) == 10
+    assert len(c._expiry) <= 2 * 10 + c.sweep_batch
+
+
+def test_expiry_queue_bounded_on_overwrite():
+    c = TTLCache(ttl=3600)
+    for i in range(200_000):
+        c.set("k", i)
+    assert c.get("k") == 199_999
+    assert len(c._expiry) <= 2 + c.sweep_batch
+
+
+def test_expiry_queue_compacted_on_remove_group():
+    c = TTLCache(ttl=3600, index_key=lambda k: k[0])
+    for i in range(1000):
+        c.set(("a", i), i)
+    c.set(("b", 0), 0)
+    assert c.remove_group("a") == 1000
+    assert len(c._expiry) <= 2 + c.sweep_batch
+    assert c.get(("b", 0)) == 0
+
+
+def test_compaction_keeps_expiration_working():
+    c = TTLCache(max_size=10, ttl=0.05)
+    for i in range(1000):
+        c.set(i % 20, i)
+    time.sleep(0.1)
+    assert c.sweep() == 10
+    assert len(c) == 0
+
+
+def test_hit_miss_eviction_and_expiration_counters():
+    c = TTLCache(max_size=2, ttl=0.05)
+    c.set("a", 1)
+    c.set("b", 2)
+    assert c.get("a") == 1
+    assert c.get("x", None) is None
+    c.set("c", 3)
+    # "b" - давно не использованная, вытесняется она, а не "a"
+    assert "b" not in c
+    assert c.get("a") == 1
+    time.sleep(0.1)
+    assert c.get("a", None) is None
+    s = c.stats
+    assert (s.hits, s.misses, s.evictions, s.expirations) == (2, 2, 1, 1)
+    assert s.hit_ratio == 0.5
@@ -0,0 +1,50 @@
+import socket
+import time
+
+import pytest
+
+from src.mybootstrap_core_itskovichanton.utils import check_urls_availability
+
+
+@pytest.fixture
+def listen_only_port():
+    # принимает TCP-соединения (backlog), но ничего не отвечает
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    s.listen(8)
+    yield s.getsockname()[1]
+    s.close()
+
+
+@pytest.fixture
+def closed_port():
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+def test_listen_only_port_is_available_by_deadline(listen_only_port):
+    url = f"http://127.0.0.1:{listen_only_port}"
+    start = time.monotonic()
+    r = check_urls_availability([url], timeout=3, deadline=0.5)[url]
+    assert time.monotonic() - start < 2
+    assert r.status == "available"
+    assert r.method == "socket"
+
+
+def test_listen_only_port_is_available_after_head_timeout(listen_only_port):
+    url = f"http://127.0.0.1:{listen_only_port}"
+    r = check_urls_availability([url], timeout=0.5)[url]
+    assert r.status == "available"
+    assert r.method == "socket"
+
+
+def test_closed_port_is_unavailable(closed_port):
+    http_url = f"http://127.0.0.1:{closed_port}"
+    tcp_url = f"127.0.0.1:{closed_port}"
+    r = check_urls_availability([http_url, tcp_url], timeout=3, deadline=2)
+    assert r[http_url].status == "unavailable"
+    assert r[http_url].error
+    assert r[tcp_url].status == "unavailable"
@@ -0,0 +1,204 @@
+import asyncio
+import random
+import threading
+from datetime import timedelta
+
+import pytest
+
+from src.mybootstrap_core_itskovichanton.stats import sync_circular_window_counter, async_circular_window_counter, \
+    keyed_circular_window_counter
+from src.mybootstrap_core_itskovichanton.stats.async_circular_window_counter import LockFreeAsyncCircularWindowCounter
+from src.mybootstrap_core_itskovichanton.stats.keyed_circular_window_counter import KeyedCircularWindowCounter
+from src.mybootstrap_core_itskovichanton.stats.sync_circular_window_counter import CircularWindowCounter, \
+    NumpyCircularWindowCounter, ShardedCircularWindowCounter
+
+# степень двойки: времена, кратные 1/64, делятся на сегменты без ошибок округления
+RESOLUTION = 0.125
+WINDOW = timedelta(seconds=2)
+
+
+class _Clock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = _Clock()
+    for module in (sync_circular_window_counter, async_circular_window_counter, keyed_circular_window_counter):
+        monkeypatch.setattr(module, "time", c)
+    return c
+
+
+class _Reference:
+    """Наивная модель окна: событие учитывается, пока его сегмент не старше buffer_size сегментов"""
+
+    def __init__(self, buffer_size):
+        self.buffer_size = buffer_size
+        self.events = []
+
+    def add(self, t, count, at=None):
+        # события из будущего попадают в текущий сегмент
+        self.events.append((min(int((t if at is None else at) // RESOLUTION), int(t // RESOLUTION)), count))
+
+    def count(self, t):
+        current = int(t // RESOLUTION)
+        return sum(c for segment, c in self.events if current - segment < self.buffer_size)
+
+
+def _random_steps(seed, n=400):
+    rnd = random.Random(seed)
+    # короткие шаги вперемешку с простоями дольше окна
+    for _ in range(n):
+        yield rnd.choice((0, 1, 1, 2, 3, 8, 16, 100, 1000)) / 64, rnd.randint(1, 5)
+
+
+@pytest.mark.parametrize("counter_class", [CircularWindowCounter, NumpyCircularWindowCounter])
+def test_rollover(clock, counter_class):
+    c = counter_class(WINDOW, RESOLUTION)
+    c.add(5)
+    clock.now = 1.0
+    c.add(3)
+    assert c.count() == 8
+    # сегмент первого события еще в окне, следующий сдвиг его очищает
+    clock.now = (c.buffer_size - 1) * RESOLUTION
+    assert c.count() == 8
+    clock.now = c.buffer_size * RESOLUTION
+    assert c.count() == 3
+    clock.now = 10.0
+    assert c.count() == 0
+    assert c.speed() == 0.0
+
+
+@pytest.mark.parametrize("counter_class", [CircularWindowCounter, NumpyCircularWindowCounter])
+def test_catch_up_matches_reference(clock, counter_class):
+    c = counter_class(WINDOW, RESOLUTION)
+    ref = _Reference(c.buffer_size)
+    for step, n in _random_steps(1):
+        clock.now += step
+        c.add(n)
+        ref.add(clock.now, n)
+        assert c.count() == ref.count(clock.now)
+
+
+@pytest.mark.parametrize("counter_class", [CircularWindowCounter, NumpyCircularWindowCounter])
+def test_add_at_matches_reference(clock, counter_class):
+    rnd = random.Random(2)
+    c = counter_class(WINDOW, RESOLUTION)
+    ref = _Reference(c.buffer_size)
+    for step, _ in _random_steps(3, n=100):
+        clock.now += step
+        timestamps = [clock.now + rnd.randint(-200, 8) / 64 for _ in range(rnd.randint(1, 20))]
+        counts = [rnd.randint(1, 5) for _ in timestamps]
+        c.add_at(timestamps, counts)
+        for ts, n in zip(timestamps, counts):
+            ref.add(clock.now, n, at=ts)
+        assert c.count() == ref.count(clock.now)
+
+
+def test_lock_free_async_catch_up_matches_reference(clock):
+    c = LockFreeAsyncCircularWindowCounter(WINDOW, RESOLUTION)
+    ref = _Reference(c.buffer_size)
+
+    async def main():
+        for step, n in _random_steps(4):
+            clock.now += step
+            await c.add(n)
+            ref.add(clock.now, n)
+            assert await c.count() == ref.count(clock.now)
+
+    asyncio.run(main())
+
+
+def test_sharded_totals_equal_unsharded_under_threads():
+    window = timedelta(minutes=10)
+    sharded = ShardedCircularWindowCounter(window)
+    plain = CircularWindowCounter(window)
+    barrier = threading.Barrier(8)
+
+    def worker(i):
+        barrier.wait()
+        for j in range(5000):
+            n = (i + j) % 3 + 1
+            sharded.add(n)
+            plain.add(n)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sharded.count() == plain.count() == sum((i + j) % 3 + 1 for i in range(8) for j in range(5000))
+    assert sharded.speed() == pytest.approx(plain.speed())
+
+
+def test_sharded_rollover(clock):
+    c = ShardedCircularWindowCounter(WINDOW, RESOLUTION)
+    ref = _Reference(c.buffer_size)
+    # кольцо потока создается первым add - отсюда отсчитываются границы сегментов
+    c.add(0)
+    for step, n in _random_steps(5):
+        clock.now += step
+        c.add(n)
+        ref.add(clock.now, n)
+        assert c.count() == ref.count(clock.now)
+
+
+def test_keyed_counts_match_reference(clock):
+    rnd = random.Random(6)
+    c = KeyedCircularWindowCounter(WINDOW, RESOLUTION, initial_capacity=1)
+    refs = {k: _Reference(c.buffer_size) for k in "abcde"}
+    for step, n in _random_steps(7):
+        clock.now += step
+        key = rnd.choice("abcde")
+        c.add(key, n)
+        refs[key].add(clock.now, n)
+        for k, ref in refs.items():
+            assert c.count(k) == ref.count(clock.now)
+    assert c.evicted == 0
+
+
+def test_keyed_evicts_least_recently_updated(clock):
+    c = KeyedCircularWindowCounter(timedelta(seconds=10), RESOLUTION, max_keys=4, initial_capacity=1)
+    for i, key in enumerate("abcd"):
+        clock.now = i * RESOLUTION
+        c.add(key, 10)
+    clock.now += RESOLUTION
+    c.add("a")
+    c.add("e")
+    # "b" обновлялся раньше всех
+    assert "b" not in c
+    assert c.count("b") == 0
+    assert c.count("a") == 11
+    assert c.count("e") == 1
+    assert c.evicted == 1
+    assert len(c) == 4
+
+
+def test_keyed_evicts_empty_windows_first(clock):
+    c = KeyedCircularWindowCounter(WINDOW, RESOLUTION, max_keys=3)
+    c.add("a")
+    c.add("b")
+    clock.now = 1.0
+    c.add("c")
+    clock.now = c.buffer_size * RESOLUTION + 0.5
+    # окна "a" и "b" опустели - при нехватке места удаляются они, а не "c"
+    c.add("d")
+    assert sorted(c.keys()) == ["c", "d"]
+    assert c.evicted == 2
+
+
+def test_keyed_evict_idle(clock):
+    c = KeyedCircularWindowCounter(timedelta(seconds=10), RESOLUTION, idle_timeout=1.0)
+    c.add("a")
+    clock.now = 0.5
+    c.add("b")
+    clock.now = 1.25
+    assert c.evict_idle() == ["a"]
+    assert c.keys() == ["b"]
+    assert c.top_k(5) == [("b", 0.1)]